@@ -0,0 +1,198 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from recipes.counters import view_counter
+from recipes.models import Recipe
+
+from .authentication import CachedTokenAuthentication
+from .conditional import etag_headers, get_recipe_etag, if_none_match
+from .facets import get_facets, parse_facets
+from .filters import RecipeFilter
+from .paginations import ApiPagination
+from .projections import (assemble_recipes, get_authors, parse_projection,
+                          recipe_author_ids, recipe_loaders)
+from .views import (IngredientViewSet, RecipeViewSet, TagViewSet,
+                    get_ingredients_data, get_tags_data)
+
+# Запросы к БД выполняются в отдельном пуле потоков: у каждого потока свое
+# соединение, поэтому размер пула ограничивает число соединений воркера.
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=settings.ASYNC_DB_THREADS,
+                                 thread_name_prefix='db')
+
+
+def call_in_db_thread(func, *args, **kwargs):
+    close_old_connections()
+    return func(*args, **kwargs)
+
+
+async def run_db(func, *args, **kwargs):
+    return await sync_to_async(
+        call_in_db_thread, thread_sensitive=False, executor=DB_EXECUTOR
+    )(func, *args, **kwargs)
+
+
+async def gather_db(loaders):
+    results = await asyncio.gather(
+        *(run_db(load) for load in loaders.values()))
+    return dict(zip(loaders, results))
+
+
+def render(data, status_code=status.HTTP_200_OK, headers=None):
+    response = HttpResponse(JSONRenderer().render(data),
+                            content_type='application/json',
+                            status=status_code)
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def authenticate(request):
+    result = CachedTokenAuthentication().authenticate(request)
+    user, auth = result or (AnonymousUser(), None)
+    api_request = Request(request, authenticators=())
+    api_request.user, api_request.auth = user, auth
+    return api_request
+
+
+def async_read_view(fallback):
+    # GET обрабатывается асинхронно, остальные методы уходят в обычное
+    # представление DRF.
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await sync_to_async(fallback)(
+                    request, *args, **kwargs)
+            try:
+                api_request = await run_db(authenticate, request)
+                return await view(api_request, *args, **kwargs)
+            except Exception as exc:
+                response = exception_handler(exc, {'request': request})
+                if response is None:
+                    raise
+                headers = {}
+                if response.status_code == status.HTTP_401_UNAUTHORIZED:
+                    headers['WWW-Authenticate'] = (
+                        CachedTokenAuthentication().authenticate_header(
+                            request))
+                return render(response.data, response.status_code, headers)
+        # csrf_exempt из Django 3.2 превращает корутину в обычную функцию.
+        wrapper.csrf_exempt = True
+        # Метрики и ограничитель нагрузки видят то же представление и
+        # действие, что и в синхронном режиме.
+        wrapper.cls, wrapper.actions = fallback.cls, fallback.actions
+        wrapper.fallback = fallback
+        return wrapper
+    return decorator
+
+
+async def get_recipes(recipe_ids, request, fields, sideload=False):
+    if not recipe_ids:
+        return [], {}
+    parts = await gather_db(recipe_loaders(recipe_ids, request, fields))
+    if 'author' in fields:
+        parts['authors'] = await run_db(
+            get_authors, recipe_author_ids(parts), request)
+    return assemble_recipes(recipe_ids, request, fields, sideload, parts)
+
+
+def filter_queryset(filterset_class, queryset, request):
+    filterset = filterset_class(request.query_params, queryset=queryset,
+                                request=request)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs
+
+
+def paginate_recipe_ids(request, paginator):
+    queryset = filter_queryset(RecipeFilter, Recipe.objects.all(), request)
+    return list(paginator.paginate_queryset(
+        queryset.values_list('pk', flat=True), request))
+
+
+@async_read_view(RecipeViewSet.as_view(
+    {'get': 'list', 'post': 'create'}, basename='recipe', detail=False))
+async def recipe_list(request):
+    paginator = ApiPagination()
+    if paginator.is_oversized(request):
+        params = request.query_params.copy()
+        for name in (paginator.page_query_param,
+                     paginator.page_size_query_param):
+            params.pop(name, None)
+        url = reverse('recipe-export')
+        return HttpResponseRedirect(
+            f'{url}?{params.urlencode()}' if params else url)
+    facets = parse_facets(request)
+    fields, sideload = parse_projection(request)
+    recipe_ids = await run_db(paginate_recipe_ids, request, paginator)
+    if facets:
+        (data, included), facet_counts = await asyncio.gather(
+            get_recipes(recipe_ids, request, fields, sideload),
+            run_db(get_facets, request, facets))
+        included['facets'] = facet_counts
+    else:
+        data, included = await get_recipes(
+            recipe_ids, request, fields, sideload)
+    page = paginator.get_paginated_response(data).data
+    page.update(included)
+    return render(page)
+
+
+@async_read_view(RecipeViewSet.as_view(
+    {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+     'delete': 'destroy'}, basename='recipe', detail=True))
+async def recipe_detail(request, pk):
+    try:
+        recipe_id = int(pk)
+    except ValueError:
+        raise Http404
+    etag = await run_db(get_recipe_etag, recipe_id, request.user)
+    if etag is None:
+        raise Http404
+    view_counter.record(recipe_id)
+    if if_none_match(request, etag):
+        return HttpResponse(status=status.HTTP_304_NOT_MODIFIED,
+                            headers=etag_headers(etag))
+    fields, _ = parse_projection(request)
+    data, _ = await get_recipes([recipe_id], request, fields)
+    if not data:
+        raise Http404
+    return render(data[0], headers=etag_headers(etag))
+
+
+@async_read_view(TagViewSet.as_view(
+    {'get': 'list'}, basename='tag', detail=False))
+async def tag_list(request):
+    return render(await run_db(get_tags_data))
+
+
+@async_read_view(TagViewSet.as_view(
+    {'get': 'retrieve'}, basename='tag', detail=True))
+async def tag_detail(request, pk):
+    return render(await run_db(get_tags_data, pk))
+
+
+@async_read_view(IngredientViewSet.as_view(
+    {'get': 'list'}, basename='ingredient', detail=False))
+async def ingredient_list(request):
+    return render(await run_db(
+        get_ingredients_data, request.query_params.get('name', '')))
+
+
+@async_read_view(IngredientViewSet.as_view(
+    {'get': 'retrieve'}, basename='ingredient', detail=True))
+async def ingredient_detail(request, pk):
+    return render(await run_db(get_ingredients_data, pk=pk))
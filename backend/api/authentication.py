@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+from .cache import LRUCache
+from .metrics import CACHE_REQUESTS
+
+# Пароль и дата входа не попадают в снимок: при сохранении такого
+# пользователя Django обновит только загруженные поля.
+SNAPSHOT_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname not in ('password', 'last_login')
+)
+CACHE_KEY = 'auth:token:{}'
+
+local_cache = LRUCache(settings.TOKEN_AUTH_CACHE['MAXSIZE'],
+                       settings.TOKEN_AUTH_CACHE['TTL'])
+
+
+def get_shared_cache():
+    alias = settings.TOKEN_AUTH_CACHE['SHARED_CACHE']
+    return caches[alias] if alias else None
+
+
+def make_snapshot(user):
+    return tuple(getattr(user, field) for field in SNAPSHOT_FIELDS)
+
+
+def restore_user(snapshot):
+    return User.from_db('default', SNAPSHOT_FIELDS, snapshot)
+
+
+def invalidate_tokens(*keys):
+    shared_cache = get_shared_cache()
+    for key in keys:
+        local_cache.delete(key)
+    if shared_cache is not None:
+        shared_cache.delete_many([CACHE_KEY.format(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        snapshot = local_cache.get(key)
+        shared_cache = get_shared_cache()
+        if snapshot is not None:
+            CACHE_REQUESTS.labels('token_auth', 'hit_local').inc()
+        elif shared_cache is not None:
+            snapshot = shared_cache.get(CACHE_KEY.format(key))
+            if snapshot is not None:
+                CACHE_REQUESTS.labels('token_auth', 'hit_shared').inc()
+                local_cache.set(key, snapshot)
+        if snapshot is not None:
+            user = restore_user(snapshot)
+            token = Token(key=key, user=user)
+            token._state.adding = False
+            return user, token
+        CACHE_REQUESTS.labels('token_auth', 'miss').inc()
+        user, token = super().authenticate_credentials(key)
+        snapshot = make_snapshot(user)
+        local_cache.set(key, snapshot)
+        if shared_cache is not None:
+            shared_cache.set(CACHE_KEY.format(key), snapshot,
+                             settings.TOKEN_AUTH_CACHE['SHARED_TTL'])
+        return user, token
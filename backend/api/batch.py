@@ -0,0 +1,129 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connection, transaction
+from django.urls import Resolver404, resolve
+from rest_framework import status
+
+from recipes.constants import BATCH_MAX_THREADS
+
+from .metrics import LOAD_SHEDDING
+from .middleware import get_view_labels
+from .shedding import acquire_slot, endpoint_class, throttle_wait
+
+logger = logging.getLogger(__name__)
+
+# GET-действия, которые пишут в БД: в пакете они выполнялись бы в
+# транзакции только для чтения.
+WRITING_ACTIONS = ('RecipeViewSet.get_link',)
+SKIPPED_META = ('HTTP_AUTHORIZATION', 'HTTP_COOKIE', 'HTTP_IF_MATCH',
+                'HTTP_IF_NONE_MATCH', 'CONTENT_TYPE', 'CONTENT_LENGTH')
+
+
+@contextmanager
+def read_snapshot(snapshot_id=None):
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL '
+                               'REPEATABLE READ READ ONLY')
+                if snapshot_id:
+                    cursor.execute('SET TRANSACTION SNAPSHOT %s',
+                                   [snapshot_id])
+        yield
+
+
+def make_subrequest(request, url):
+    parts = urlsplit(url)
+    environ = {key: value for key, value in request.META.items()
+               if key not in SKIPPED_META}
+    environ.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'SCRIPT_NAME': '',
+        'wsgi.input': BytesIO(),
+        'wsgi.url_scheme': request.scheme,
+    })
+    subrequest = WSGIRequest(environ)
+    if request.user.is_authenticated:
+        subrequest._force_auth_user = request.user
+        subrequest._force_auth_token = request.auth
+    return subrequest
+
+
+def run_subrequest(request, url):
+    try:
+        match = resolve(urlsplit(url).path)
+    except Resolver404:
+        return {'url': url, 'status': status.HTTP_404_NOT_FOUND,
+                'data': None}
+    if match.func is request.resolver_match.func:
+        return {'url': url, 'status': status.HTTP_400_BAD_REQUEST,
+                'data': None}
+    # Асинхронные представления читают БД из своего пула соединений, мимо
+    # снимка пакета, поэтому подзапрос выполняет синхронный вариант.
+    view = getattr(match.func, 'fallback', match.func)
+    subrequest = make_subrequest(request, url)
+    view_name, action = get_view_labels(subrequest, view)
+    if f'{view_name}.{action}' in WRITING_ACTIONS:
+        return {'url': url, 'status': status.HTTP_400_BAD_REQUEST,
+                'data': None}
+    # Пакет занимает один слот своего класса, а каждый подзапрос — слот
+    # класса своего представления и токен ограничителя частоты, как если
+    # бы пришел отдельно.
+    name = endpoint_class(subrequest, view_name, action)
+    if throttle_wait(request):
+        LOAD_SHEDDING.labels(name, 'throttled').inc()
+        return {'url': url, 'status': status.HTTP_429_TOO_MANY_REQUESTS,
+                'data': None}
+    release = acquire_slot(name)
+    if release is None:
+        LOAD_SHEDDING.labels(name, 'shed_concurrency').inc()
+        return {'url': url, 'status': status.HTTP_503_SERVICE_UNAVAILABLE,
+                'data': None}
+    try:
+        # Точка сохранения: ошибка БД в подзапросе не прерывает общую
+        # транзакцию снимка для остальных.
+        with transaction.atomic():
+            response = view(subrequest, *match.args, **match.kwargs)
+        return {'url': url, 'status': response.status_code,
+                'data': getattr(response, 'data', None)}
+    except Exception:
+        logger.exception('Ошибка подзапроса %s', url)
+        return {'url': url, 'status': status.HTTP_500_INTERNAL_SERVER_ERROR,
+                'data': None}
+    finally:
+        release()
+
+
+def run_in_snapshot(request, url, snapshot_id):
+    try:
+        with read_snapshot(snapshot_id):
+            return run_subrequest(request, url)
+    finally:
+        connection.close()
+
+
+def run_batch(request, requests, parallel=False):
+    # Все подзапросы читают один снимок данных. Параллельные потоки
+    # работают в своих соединениях и импортируют снимок основного
+    # (pg_export_snapshot), поэтому параллельно можно только в PostgreSQL.
+    with read_snapshot():
+        if not parallel or len(requests) == 1 or (
+                connection.vendor != 'postgresql'):
+            return [run_subrequest(request, url) for url in requests]
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_export_snapshot()')
+            snapshot_id = cursor.fetchone()[0]
+        with ThreadPoolExecutor(
+                max_workers=min(len(requests), BATCH_MAX_THREADS)
+        ) as executor:
+            return list(executor.map(
+                partial(run_in_snapshot, request, snapshot_id=snapshot_id),
+                requests))
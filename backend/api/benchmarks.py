@@ -0,0 +1,122 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_env(**extra):
+    return {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'backend.settings'),
+        **{key: str(value) for key, value in extra.items()},
+    }
+
+
+@contextmanager
+def gunicorn(port, **env):
+    server = subprocess.Popen(
+        (sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py'),
+        cwd=settings.BASE_DIR,
+        env=server_env(GUNICORN_BIND=f'127.0.0.1:{port}', **env),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        yield server
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def wait_ready(url, server, timeout, started=None):
+    started = started or time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if server.poll() is not None:
+            raise CommandError('gunicorn завершился при запуске')
+        try:
+            with urlopen(url) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except (URLError, ConnectionError):
+            pass
+        time.sleep(0.05)
+    raise CommandError(f'Нет ответа 200 от {url} за {timeout} с')
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    headers = dict(
+        (name.strip().lower(), value.strip())
+        for name, _, value in (line.partition(':') for line in lines[1:])
+        if name)
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def load_client(host, port, paths, offset, deadline, stats):
+    reader = writer = None
+    index = offset
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n'
+                         .encode())
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            stats['errors'] += 1
+            keep_alive = False
+        else:
+            stats['latencies'].append(time.perf_counter() - started)
+            stats['statuses'][status] += 1
+        if not keep_alive and writer is not None:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(host, port, paths, concurrency, duration):
+    stats = {'latencies': [], 'statuses': Counter(), 'errors': 0}
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        load_client(host, port, paths, offset, deadline, stats)
+        for offset in range(concurrency)))
+    return stats
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
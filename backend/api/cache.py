@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from .metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.data[key] = (value, expires)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TwoTierCache:
+    # Первый уровень — LRU в памяти процесса, второй — общий кэш Django.
+    # Запись свежа TTL секунд, затем еще STALE_TTL секунд отдается
+    # устаревшей, пока один поток обновляет ее в фоне. Инвалидация меняет
+    # версию пространства ключей; другие процессы замечают ее не позже
+    # чем через VERSION_TTL секунд.
+    def __init__(self, name, ttl=None, stale_ttl=None, maxsize=None):
+        options = settings.TWO_TIER_CACHE
+        self.name = name
+        self.ttl = options['TTL'] if ttl is None else ttl
+        self.stale_ttl = (options['STALE_TTL'] if stale_ttl is None
+                          else stale_ttl)
+        self.alias = options['SHARED_CACHE']
+        self.local = LRUCache(maxsize or options['MAXSIZE'],
+                              self.ttl + self.stale_ttl)
+        self.versions = LRUCache(1, options['VERSION_TTL'])
+        self.local_version = 0
+        self.version_key = f'two_tier:{name}:version'
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def version(self):
+        version = self.versions.get(self.name)
+        if version is not None:
+            return version
+        shared = self.shared
+        if shared is None:
+            return self.local_version
+        with self.lock:
+            version = self.versions.get(self.name)
+            if version is None:
+                shared.add(self.version_key, time.time_ns(), None)
+                version = shared.get(self.version_key, self.local_version)
+                self.versions.set(self.name, version)
+        return version
+
+    def invalidate(self):
+        version = time.time_ns()
+        shared = self.shared
+        if shared is not None:
+            shared.set(self.version_key, version, None)
+        self.local_version = version
+        self.versions.set(self.name, version)
+        self.local.clear()
+
+    def get_or_set(self, key, compute):
+        full_key = f'two_tier:{self.name}:{self.version()}:{key}'
+        entry = self.local.get(full_key)
+        result = 'hit_local'
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(full_key)
+            result = 'hit_shared'
+            if entry is not None:
+                self.local.set(full_key, entry, max(
+                    entry[1] + self.stale_ttl - time.time(), 0))
+        if entry is None:
+            return self.fill(full_key, compute)
+        value, fresh_until = entry
+        if fresh_until < time.time():
+            result = 'stale'
+            self.revalidate(full_key, compute)
+        CACHE_REQUESTS.labels(self.name, result).inc()
+        return value
+
+    def store(self, full_key, compute):
+        value = compute()
+        entry = (value, time.time() + self.ttl)
+        self.local.set(full_key, entry)
+        if self.shared is not None:
+            self.shared.set(full_key, entry, self.ttl + self.stale_ttl)
+        return value
+
+    def start_flight(self, full_key):
+        with self.lock:
+            flight = self.flights.get(full_key)
+            if flight is not None:
+                return flight, False
+            flight = self.flights[full_key] = Flight()
+            return flight, True
+
+    def finish_flight(self, full_key, flight, compute):
+        try:
+            flight.value = self.store(full_key, compute)
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.flights[full_key]
+            flight.done.set()
+        return flight.value
+
+    def fill(self, full_key, compute):
+        # Одновременные промахи по одному ключу вычисляют значение один раз,
+        # остальные потоки ждут результат (или исключение) первого.
+        flight, leader = self.start_flight(full_key)
+        if not leader:
+            CACHE_REQUESTS.labels(self.name, 'coalesced').inc()
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        CACHE_REQUESTS.labels(self.name, 'miss').inc()
+        return self.finish_flight(full_key, flight, compute)
+
+    def revalidate(self, full_key, compute):
+        flight, leader = self.start_flight(full_key)
+        if leader:
+            threading.Thread(
+                target=self.refresh, args=(full_key, flight, compute),
+                name=f'cache-refresh-{self.name}', daemon=True,
+            ).start()
+
+    def refresh(self, full_key, flight, compute):
+        try:
+            self.finish_flight(full_key, flight, compute)
+        except Exception:
+            logger.exception('Не удалось обновить %s в кэше %s',
+                             full_key, self.name)
+        finally:
+            connections.close_all()
+
+
+tag_cache = TwoTierCache('tags')
+ingredient_cache = TwoTierCache('ingredients')
+short_link_cache = TwoTierCache('short_links')
+facet_cache = TwoTierCache('facets')
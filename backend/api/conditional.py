@@ -0,0 +1,69 @@
+import re
+
+from django.db.models import Exists, OuterRef
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+ETAG_VERSION = re.compile(r'(?:W/)?"(\d+)')
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'Рецепт был изменён, обновите данные и повторите запрос.'
+    default_code = 'precondition_failed'
+
+
+def get_recipe_etag(recipe_id, user, lock=False):
+    recipes = Recipe.objects.filter(pk=recipe_id)
+    if lock:
+        recipes = recipes.select_for_update()
+    if not user.is_authenticated:
+        version = recipes.values_list('version', flat=True).first()
+        return None if version is None else f'"{version}"'
+    row = recipes.annotate(
+        is_favorited=Exists(Favorite.objects.filter(
+            user=user, recipe=OuterRef('pk'))),
+        is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+            user=user, recipe=OuterRef('pk'))),
+        is_subscribed=Exists(Subscription.objects.filter(
+            user=user, author=OuterRef('author'))),
+    ).values_list('version', 'is_favorited', 'is_in_shopping_cart',
+                  'is_subscribed').first()
+    if row is None:
+        return None
+    version, *flags = row
+    return f'"{version}-{user.pk}-{"".join(str(int(f)) for f in flags)}"'
+
+
+def etag_headers(etag):
+    # ETag авторизованного запроса зависит от пользователя, поэтому общие
+    # кэши не должны отдавать ответ одного пользователя другому.
+    return {'ETag': etag, 'Vary': 'Authorization'}
+
+
+def etag_version(etag):
+    return int(ETAG_VERSION.match(etag).group(1))
+
+
+def if_none_match(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if header is None:
+        return False
+    return header.strip() == '*' or etag in (
+        tag.strip().replace('W/', '', 1) for tag in header.split(','))
+
+
+def check_if_match(request, etag):
+    header = request.META.get('HTTP_IF_MATCH')
+    if header is None or header.strip() == '*':
+        return
+    versions = {
+        int(match.group(1)) for match in map(
+            ETAG_VERSION.match, (tag.strip() for tag in header.split(',')))
+        if match
+    }
+    if etag_version(etag) not in versions:
+        raise PreconditionFailed
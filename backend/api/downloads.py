@@ -0,0 +1,52 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+
+
+def protected_path(name):
+    return os.path.join(settings.PROTECTED_ROOT, name)
+
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path),
+                                     delete=False) as file:
+        file.write(data)
+    # nginx читает файл от своего пользователя.
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def write_protected(name, data):
+    write_atomic(protected_path(name), data)
+
+
+def delete_protected(name):
+    remove_file(protected_path(name))
+
+
+def protected_response(name, filename, content_type):
+    # Права проверяет Django, а байты файла отдает nginx из internal
+    # location; без nginx (разработка) файл отдается самим Django.
+    if settings.USE_X_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = f'{settings.PROTECTED_URL}{name}'
+    else:
+        response = FileResponse(open(protected_path(name), 'rb'),
+                                content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+def shopping_list_name(user_id):
+    return f'shopping_lists/{user_id}.txt'
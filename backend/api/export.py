@@ -0,0 +1,73 @@
+import json
+import tempfile
+from itertools import islice
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+
+from recipes.constants import EXPORT_CHUNK_SIZE
+from recipes.models import Recipe
+
+from .projections import RECIPE_OUTPUT_FIELDS, get_recipes_data
+
+SHORT_RECIPE_FIELDS = ('id', 'name', 'image', 'cooking_time')
+
+
+def iter_recipe_ids(queryset):
+    recipe_ids = queryset.values_list('pk', flat=True).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE)
+    while True:
+        chunk = list(islice(recipe_ids, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            return
+        yield chunk
+
+
+def recipe_rows(queryset, request, fields=RECIPE_OUTPUT_FIELDS):
+    for chunk in iter_recipe_ids(queryset):
+        yield from get_recipes_data(chunk, request, fields)
+
+
+def to_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False).encode() + b'\n'
+
+
+def spool(chunks):
+    file = tempfile.TemporaryFile()
+    for chunk in chunks:
+        file.write(chunk)
+    file.seek(0)
+    return file
+
+
+def ndjson_response(rows, filename, request):
+    # ASGI-обработчик Django 3.2 перебирает потоковый ответ прямо в цикле
+    # событий, где запросы к БД запрещены. Поэтому под ASGI строки пишутся
+    # во временный файл в потоке представления, а отдается уже файл.
+    if isinstance(request._request, ASGIRequest):
+        return FileResponse(spool(to_ndjson(rows)), as_attachment=True,
+                            filename=filename,
+                            content_type='application/x-ndjson')
+    response = StreamingHttpResponse(
+        to_ndjson(rows), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def user_export_rows(user, request):
+    yield {'type': 'user', 'data': {
+        'id': user.id, 'email': user.email, 'username': user.username,
+        'first_name': user.first_name, 'last_name': user.last_name,
+    }}
+    sections = (
+        ('recipe', user.recipes.order_by('pk'), RECIPE_OUTPUT_FIELDS),
+        ('favorite', Recipe.objects.filter(favorites__user=user).order_by(
+            'favorites__id'), SHORT_RECIPE_FIELDS),
+        ('shopping_cart', Recipe.objects.filter(
+            shoppingcarts__user=user).order_by('shoppingcarts__id'),
+         SHORT_RECIPE_FIELDS),
+    )
+    for kind, queryset, fields in sections:
+        for row in recipe_rows(queryset, request, fields):
+            yield {'type': kind, 'data': row}
@@ -0,0 +1,87 @@
+from functools import partial
+
+from django.db.models import Count, F, Q
+from rest_framework.exceptions import ValidationError
+
+from recipes.catalog import get_tag_catalog
+from recipes.constants import FACET_AUTHORS_LIMIT
+from recipes.models import Recipe
+
+from .cache import facet_cache
+from .filters import RecipeFilter
+
+FACETS = ('tags', 'author')
+
+
+def parse_facets(request):
+    names = [name for name in request.query_params.get(
+        'facets', '').split(',') if name]
+    unknown = sorted(set(names) - set(FACETS))
+    if unknown:
+        raise ValidationError({'facets': [
+            f'Неизвестный фасет: {name}' for name in unknown]})
+    return [name for name in FACETS if name in names]
+
+
+def count_tags(queryset):
+    # Один агрегат с COUNT ... FILTER на каждый тег: результат — одна
+    # строка, сколько бы ни было авторов и сочетаний тегов.
+    catalog = get_tag_catalog()
+    hits, counts = {}, {}
+    for number, (slug, bit) in enumerate(catalog.items()):
+        if bit:
+            hits[f'hits_{number}'] = F('tags_mask').bitand(bit)
+            condition = ~Q(**{f'hits_{number}': 0})
+        else:
+            condition = Q(pk__in=Recipe.tags.through.objects.filter(
+                tag__slug=slug).values('recipe_id'))
+        counts[f'tag_{number}'] = Count('pk', filter=condition)
+    if not counts:
+        return {}
+    result = queryset.alias(**hits).aggregate(**counts)
+    return {slug: result[f'tag_{number}']
+            for number, slug in enumerate(catalog)}
+
+
+def count_authors(queryset):
+    return dict(queryset.values('author').annotate(
+        count=Count('pk')).values_list('author', 'count').order_by(
+        '-count', 'author')[:FACET_AUTHORS_LIMIT])
+
+
+COUNTERS = {'tags': count_tags, 'author': count_authors}
+
+
+def count_facet(request, name):
+    # Фасеты дизъюнктивные: счетчики не учитывают собственный фильтр
+    # фасета, остальные фильтры применяются как к списку. Поэтому у каждого
+    # фасета свое множество строк и свой запрос: общий запрос пришлось бы
+    # группировать по автору и суммировать теги по всем группам, а кэш
+    # каждого фасета зависит только от фильтров других фасетов.
+    params = request.query_params.copy()
+    params.pop(name, None)
+    filterset = RecipeFilter(params, queryset=Recipe.objects.all(),
+                             request=request)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return COUNTERS[name](filterset.qs.order_by())
+
+
+def get_facets(request, facets):
+    params = request.query_params
+    # Анонимные запросы без личных фильтров зависят только от выбранных
+    # тегов и автора, поэтому их счетчики кэшируются.
+    cacheable = request.user.is_anonymous and not any(
+        params.get(name) for name in RecipeFilter.base_filters
+        if name not in FACETS)
+    result = {}
+    for name in facets:
+        compute = partial(count_facet, request, name)
+        if not cacheable:
+            result[name] = compute()
+            continue
+        key = name + ''.join(
+            f':{other}=' + ','.join(sorted(params.getlist(other)))
+            for other in FACETS if other != name)
+        result[name] = facet_cache.get_or_set(key, compute)
+    return result
@@ -0,0 +1,9 @@
+from drf_extra_fields.fields import Base64ImageField as BaseBase64ImageField
+
+from .metrics import IMAGE_QUEUE_DEPTH
+
+
+class Base64ImageField(BaseBase64ImageField):
+    def to_internal_value(self, data):
+        with IMAGE_QUEUE_DEPTH.track_inprogress():
+            return super().to_internal_value(data)
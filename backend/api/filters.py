@@ -1,6 +1,9 @@
 import django_filters
+from django.db.models import F, Q
 
-from recipes.models import Ingredient, Recipe, ShoppingCart, Tag
+from recipes.catalog import (MAX_ENUMERATED_TAGS, get_tag_catalog,
+                             masks_intersecting)
+from recipes.models import Ingredient, Recipe, ShoppingCart
 
 
 class IngredientFilter(django_filters.FilterSet):
@@ -12,10 +15,9 @@ class IngredientFilter(django_filters.FilterSet):
 
 
 class RecipeFilter(django_filters.FilterSet):
-    tags = django_filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        queryset=Tag.objects.all(),
-        to_field_name='slug',
+    tags = django_filters.MultipleChoiceFilter(
+        choices=lambda: [(slug, slug) for slug in get_tag_catalog()],
+        method='filter_tags',
     )
     is_in_shopping_cart = django_filters.CharFilter(
         method='filter_is_in_shopping_cart')
@@ -25,6 +27,25 @@ class RecipeFilter(django_filters.FilterSet):
         model = Recipe
         fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        catalog = get_tag_catalog()
+        mask = 0
+        for slug in value:
+            mask |= catalog[slug]
+        matches = Q()
+        if mask and len(catalog) <= MAX_ENUMERATED_TAGS:
+            matches |= Q(tags_mask__in=list(masks_intersecting(mask, catalog)))
+        elif mask:
+            queryset = queryset.alias(tag_hits=F('tags_mask').bitand(mask))
+            matches |= ~Q(tag_hits=0)
+        unmapped = [slug for slug in value if not catalog[slug]]
+        if unmapped:
+            matches |= Q(pk__in=Recipe.tags.through.objects.filter(
+                tag__slug__in=unmapped).values('recipe_id'))
+        return queryset.filter(matches)
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value:
@@ -0,0 +1,218 @@
+import itertools
+import json
+import random
+from types import SimpleNamespace
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.http import QueryDict
+
+from api.filters import RecipeFilter
+from api.paginations import ApiPagination
+from api.views import RecipeViewSet
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+from recipes.signals import refresh_tags_masks
+from users.models import User
+
+SEED_BATCH_SIZE = 1000
+
+WATCHED_TABLES = {
+    Recipe._meta.db_table,
+    Recipe.tags.through._meta.db_table,
+    Favorite._meta.db_table,
+    ShoppingCart._meta.db_table,
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+def walk_plan(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from walk_plan(child)
+
+
+def find_flags(plan, min_rows):
+    flags = set()
+    for node in walk_plan(plan):
+        node_type = node['Node Type']
+        relation = node.get('Relation Name')
+        if (node_type == 'Seq Scan' and relation in WATCHED_TABLES
+                and node.get('Actual Rows', node['Plan Rows']) >= min_rows):
+            flags.add(f'seq_scan:{relation}')
+        elif node_type in ('Sort', 'Incremental Sort'):
+            flags.add('sort:' + ','.join(node.get('Sort Key', ())))
+    return sorted(flags)
+
+
+class Command(BaseCommand):
+    help = ('Прогон EXPLAIN (ANALYZE, BUFFERS) для всех комбинаций '
+            'фильтров RecipeFilter')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Количество тестовых рецептов (данные откатываются)'
+        )
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=1000,
+            help='Минимум строк, начиная с которого Seq Scan считается '
+                 'проблемой'
+        )
+        parser.add_argument(
+            '--report',
+            type=str,
+            default='query_plans.json',
+            help='Путь к файлу отчета'
+        )
+        parser.add_argument(
+            '--baseline',
+            type=str,
+            help='Отчет предыдущего прогона для поиска регрессий'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'EXPLAIN (ANALYZE, BUFFERS) доступен только для PostgreSQL')
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options['seed'])
+                report = self.audit(options['min_rows'])
+                raise Rollback
+        except Rollback:
+            pass
+        with open(options['report'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        for entry in report:
+            style = (self.style.WARNING if entry['flags']
+                     else self.style.SUCCESS)
+            self.stdout.write(style(
+                f'{entry["name"]}: {entry["execution_time"]:.2f} мс '
+                f'{", ".join(entry["flags"]) or "ok"}'))
+        if options['baseline']:
+            self.check_regressions(report, options['baseline'])
+
+    def seed(self, count):
+        tags = list(Tag.objects.all())
+        authors = User.objects.bulk_create(
+            User(username=f'audit_{i}', email=f'audit_{i}@example.com',
+                 first_name='audit', last_name='audit')
+            for i in range(max(count // 100, 1))
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=random.choice(authors), name=f'Рецепт {i}',
+                   image='recipes/images/audit.png', text='audit',
+                   cooking_time=random.randint(1, 120))
+            for i in range(count)
+        )
+        if tags:
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.id,
+                                    tag_id=random.choice(tags).id)
+                for recipe in recipes
+            )
+            # bulk_create не отправляет m2m_changed, маски тегов
+            # заполняются отдельно, иначе фильтр по тегам их не найдет.
+            recipe_ids = [recipe.id for recipe in recipes]
+            for start in range(0, len(recipe_ids), SEED_BATCH_SIZE):
+                refresh_tags_masks(
+                    recipe_ids[start:start + SEED_BATCH_SIZE])
+        sample = random.sample(recipes, min(len(recipes), 200))
+        Favorite.objects.bulk_create(
+            Favorite(user=authors[0], recipe=recipe) for recipe in sample)
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=authors[0], recipe=recipe) for recipe in sample)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def combinations(self):
+        user = User.objects.filter(
+            favorites__isnull=False).first() or User.objects.first()
+        author = Recipe.objects.values_list('author_id', flat=True).first()
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+        options = {
+            'author': (None, author),
+            'tags': (None, slugs[:1], slugs) if slugs else (None,),
+            'is_favorited': (None, '1'),
+            'is_in_shopping_cart': (None, '1'),
+        }
+        for values in itertools.product(*options.values()):
+            params = {key: value for key, value in zip(options, values)
+                      if value}
+            authenticated = ('is_favorited' in params
+                             or 'is_in_shopping_cart' in params)
+            yield params, user if authenticated else AnonymousUser()
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+            result = cursor.fetchone()[0]
+        if isinstance(result, str):
+            result = json.loads(result)
+        return sql, [str(param) for param in params], result[0]
+
+    def audit(self, min_rows):
+        report = []
+        page_size = ApiPagination.page_size
+        for params, user in self.combinations():
+            data = {key: (value if isinstance(value, list) else str(value))
+                    for key, value in params.items()}
+            filterset = RecipeFilter(
+                self.to_querydict(data), queryset=RecipeViewSet.queryset,
+                request=SimpleNamespace(user=user))
+            if not filterset.is_valid():
+                raise CommandError(filterset.errors)
+            queryset = filterset.qs
+            name = ' & '.join(
+                f'{key}[{len(value)}]' if isinstance(value, list) else key
+                for key, value in sorted(data.items())
+            ) or 'all'
+            for kind, query in (('page', queryset[:page_size]),
+                                ('count', queryset.order_by().values('pk'))):
+                sql, sql_params, plan = self.explain(query)
+                report.append({
+                    'name': f'{name} [{kind}]',
+                    'sql': sql,
+                    'params': sql_params,
+                    'flags': find_flags(plan['Plan'], min_rows),
+                    'execution_time': plan['Execution Time'],
+                    'plan': plan,
+                })
+        return report
+
+    @staticmethod
+    def to_querydict(data):
+        querydict = QueryDict(mutable=True)
+        for key, value in data.items():
+            if isinstance(value, list):
+                querydict.setlist(key, value)
+            else:
+                querydict[key] = value
+        return querydict
+
+    def check_regressions(self, report, baseline_path):
+        with open(baseline_path, encoding='utf-8') as file:
+            baseline = {entry['name']: set(entry['flags'])
+                        for entry in json.load(file)}
+        regressions = []
+        for entry in report:
+            new_flags = set(entry['flags']) - baseline.get(entry['name'],
+                                                           set())
+            if new_flags:
+                regressions.append(
+                    f'{entry["name"]}: {", ".join(sorted(new_flags))}')
+        if regressions:
+            raise CommandError(
+                'Планы запросов ухудшились:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий планов не найдено.'))
@@ -0,0 +1,96 @@
+import asyncio
+import tempfile
+from urllib.parse import quote
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import (free_port, gunicorn, percentile, run_load,
+                            wait_ready)
+from recipes.models import Recipe
+
+MODES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочное сравнение синхронных воркеров gunicorn (wsgi) и '
+            'воркеров uvicorn с асинхронными представлениями (asgi)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes',
+            nargs='+',
+            choices=MODES,
+            default=MODES,
+            help='Режимы сервера для сравнения'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=500,
+            help='Количество одновременных клиентов'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=20,
+            help='Длительность нагрузки в каждом режиме, секунд'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=3,
+            help='Количество воркеров gunicorn'
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Адрес для нагрузки, можно указать несколько раз. '
+                 'По умолчанию список и карточка рецепта, теги, ингредиенты'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=60,
+            help='Сколько ждать запуска сервера, секунд'
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self.default_paths()
+        for mode in options['modes']:
+            self.run_mode(mode, paths, options)
+
+    def default_paths(self):
+        paths = ['/api/recipes/', '/api/tags/',
+                 f'/api/ingredients/?name={quote("а")}']
+        recipe_id = Recipe.objects.values_list('pk', flat=True).first()
+        if recipe_id is not None:
+            paths.append(f'/api/recipes/{recipe_id}/')
+        return paths
+
+    def run_mode(self, mode, paths, options):
+        port = free_port()
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            # Все запросы идут с одного адреса, ограничитель частоты
+            # исказил бы замер.
+            with gunicorn(port, SERVER_MODE=mode, LOAD_SHEDDING=False,
+                          GUNICORN_WORKERS=options['workers'],
+                          PROMETHEUS_MULTIPROC_DIR=metrics_dir) as server:
+                wait_ready(f'http://127.0.0.1:{port}{paths[0]}', server,
+                           options['timeout'])
+                stats = asyncio.run(run_load(
+                    '127.0.0.1', port, paths, options['concurrency'],
+                    options['duration']))
+        latencies = stats['latencies']
+        self.stdout.write(self.style.SUCCESS(
+            f'{mode}: {len(latencies) / options["duration"]:.0f} запросов/с, '
+            f'ошибок соединения {stats["errors"]}'))
+        percentiles = ', '.join(
+            f'p{round(share * 100)} {percentile(latencies, share) * 1000:.0f}'
+            for share in (0.5, 0.95, 0.99))
+        self.stdout.write(
+            f'  задержка, мс: {percentiles}, '
+            f'max {max(latencies, default=0) * 1000:.0f}')
+        self.stdout.write('  статусы: ' + ', '.join(
+            f'{status}: {count}'
+            for status, count in sorted(stats['statuses'].items())))
@@ -0,0 +1,109 @@
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import free_port, gunicorn, server_env, wait_ready
+
+IMPORT_SCRIPT = (
+    'import time\n'
+    'started = time.perf_counter()\n'
+    'from backend.wsgi import application\n'
+    'print(time.perf_counter() - started)\n'
+)
+
+
+def read_kb(path, key):
+    try:
+        for line in Path(path).read_text().splitlines():
+            if line.startswith(key):
+                return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def child_pids(pid):
+    children = []
+    for stat in Path('/proc').glob('[0-9]*/stat'):
+        try:
+            fields = stat.read_text().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(stat.parent.name))
+    return sorted(children)
+
+
+class Command(BaseCommand):
+    help = ('Замер холодного старта gunicorn: время импорта, время до '
+            'первого ответа 200 и память воркеров с preload и без него')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=3,
+            help='Количество воркеров gunicorn'
+        )
+        parser.add_argument(
+            '--path',
+            default='/api/tags/',
+            help='Адрес, на который отправляются запросы'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Запросов после первого ответа, перед замером памяти'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=60,
+            help='Сколько ждать первого ответа, секунд'
+        )
+
+    def handle(self, *args, **options):
+        imports = subprocess.run(
+            (sys.executable, '-c', IMPORT_SCRIPT), cwd=settings.BASE_DIR,
+            env=server_env(), capture_output=True, text=True, check=True)
+        self.stdout.write(
+            f'Импорт приложения: {float(imports.stdout) * 1000:.0f} мс')
+        for preload in (True, False):
+            self.run_server(preload, options)
+
+    def run_server(self, preload, options):
+        port = free_port()
+        url = f'http://127.0.0.1:{port}{options["path"]}'
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            started = time.perf_counter()
+            with gunicorn(port, GUNICORN_WORKERS=options['workers'],
+                          GUNICORN_PRELOAD=preload,
+                          PROMETHEUS_MULTIPROC_DIR=metrics_dir) as server:
+                first_response = wait_ready(url, server, options['timeout'],
+                                            started)
+                for _ in range(options['requests']):
+                    urlopen(url).read()
+                workers = child_pids(server.pid)
+                while len(workers) < options['workers'] and (
+                        time.perf_counter() - started < options['timeout']):
+                    time.sleep(0.05)
+                    workers = child_pids(server.pid)
+                memory = [
+                    (read_kb(f'/proc/{pid}/status', 'VmRSS:'),
+                     read_kb(f'/proc/{pid}/smaps_rollup', 'Pss:'))
+                    for pid in workers
+                ]
+        mode = 'preload' if preload else 'без preload'
+        self.stdout.write(self.style.SUCCESS(
+            f'{mode}: первый ответ 200 через {first_response * 1000:.0f} мс'))
+        for pid, (rss, pss) in zip(workers, memory):
+            self.stdout.write(f'  воркер {pid}: RSS {rss} КБ, PSS {pss} КБ')
+        if memory:
+            total = sum(pss or 0 for _, pss in memory)
+            self.stdout.write(f'  PSS воркеров всего: {total} КБ')
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe
+from users.models import User
+
+EXPORTS = (
+    ('/api/recipes/export/', 'recipes'),
+    ('/api/users/me/export/', 'user'),
+)
+
+
+async def call_asgi(application, path, token):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', b'localhost'),
+                    (b'authorization', f'Token {token}'.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    start = next(message for message in messages
+                 if message['type'] == 'http.response.start')
+    body = b''.join(message.get('body', b'') for message in messages
+                    if message['type'] == 'http.response.body')
+    return start['status'], body
+
+
+class Command(BaseCommand):
+    help = ('Проверка выгрузок NDJSON через ASGI-приложение: ответ 200, '
+            'все строки — JSON, число строк совпадает с БД')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email',
+            type=str,
+            help='Пользователь для личной выгрузки (по умолчанию первый)'
+        )
+
+    def expect(self, condition, message):
+        if not condition:
+            raise CommandError(message)
+        self.stdout.write(f'OK: {message}')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        if options['email']:
+            users = users.filter(email=options['email'])
+        user = users.order_by('pk').first()
+        if user is None:
+            raise CommandError('Нет активного пользователя для проверки.')
+        token, created = Token.objects.get_or_create(user=user)
+        expected = {
+            'recipes': Recipe.objects.count(),
+            'user': 1 + user.recipes.count()
+            + Recipe.objects.filter(favorites__user=user).count()
+            + Recipe.objects.filter(shoppingcarts__user=user).count(),
+        }
+        application = get_asgi_application()
+        try:
+            for path, kind in EXPORTS:
+                status, body = asyncio.run(
+                    call_asgi(application, path, token.key))
+                self.expect(status == 200, f'{path}: статус {status}')
+                try:
+                    rows = [json.loads(line) for line in body.splitlines()]
+                except ValueError:
+                    raise CommandError(f'{path}: строка не JSON')
+                self.expect(
+                    len(rows) == expected[kind],
+                    f'{path}: {len(rows)} строк из {expected[kind]}')
+        finally:
+            if created:
+                token.delete()
+        self.stdout.write(self.style.SUCCESS(
+            'Выгрузки через ASGI работают.'))
@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import LRUCache, TwoTierCache
+
+
+class Command(BaseCommand):
+    help = ('Проверка LRU и TwoTierCache: вытеснение, единственное '
+            'вычисление при одновременных промахах, отдача устаревших '
+            'значений и инвалидация')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=32,
+            help='Количество одновременных запросов к одному ключу'
+        )
+
+    def expect(self, condition, message):
+        if not condition:
+            raise CommandError(message)
+        self.stdout.write(f'OK: {message}')
+
+    def handle(self, *args, **options):
+        lru = LRUCache(maxsize=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.expect(lru.get('b') is None and lru.get('a') == 1
+                    and len(lru) == 2,
+                    'LRU вытесняет давно не использованный ключ')
+
+        cache = TwoTierCache(f'check_{time.time_ns()}', ttl=1, stale_ttl=60,
+                             maxsize=10)
+        calls = []
+        release = threading.Event()
+
+        def slow_compute():
+            calls.append(threading.current_thread().name)
+            release.wait(5)
+            return len(calls)
+
+        with ThreadPoolExecutor(options['threads']) as executor:
+            futures = [executor.submit(cache.get_or_set, 'key', slow_compute)
+                       for _ in range(options['threads'])]
+            time.sleep(0.2)
+            release.set()
+            results = {future.result() for future in futures}
+        self.expect(len(calls) == 1 and results == {1},
+                    f'{options["threads"]} одновременных промахов '
+                    f'вычислили значение один раз')
+
+        def failing_compute():
+            raise ValueError('ошибка вычисления')
+
+        try:
+            cache.get_or_set('broken', failing_compute)
+        except ValueError:
+            pass
+        self.expect(cache.get_or_set('broken', lambda: 'ok') == 'ok',
+                    'Исключение не кэшируется')
+
+        time.sleep(1.1)
+        self.expect(cache.get_or_set('key', slow_compute) == 1,
+                    'Устаревшее значение отдается сразу')
+        deadline = time.monotonic() + 5
+        while (cache.get_or_set('key', slow_compute) != 2
+               and time.monotonic() < deadline):
+            time.sleep(0.05)
+        self.expect(len(calls) == 2,
+                    'Устаревшее значение обновлено в фоне один раз')
+
+        cache.invalidate()
+        self.expect(cache.get_or_set('key', lambda: 'new') == 'new',
+                    'После инвалидации значение вычисляется заново')
+
+        small = TwoTierCache(f'check_{time.time_ns()}', maxsize=2)
+        small.alias = None
+        for key in 'abc':
+            small.get_or_set(key, lambda key=key: key)
+        recomputed = small.get_or_set('a', lambda: 'recomputed')
+        self.expect(recomputed == 'recomputed' and len(small.local) == 2,
+                    'Локальный уровень ограничен MAXSIZE')
+        self.stdout.write(self.style.SUCCESS('Проверки кэша пройдены.'))
@@ -0,0 +1,68 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.projections import get_recipes_data
+from api.serializers import RecipeGetSerializer
+from api.views import RecipeViewSet
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Сверка ответа get_recipes_data с RecipeGetSerializer '
+            'и замер процессорного времени')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email',
+            type=str,
+            help='Пользователь, от имени которого строится ответ'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=6,
+            help='Количество рецептов на странице'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Количество повторов для замера'
+        )
+
+    def handle(self, *args, **options):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = (User.objects.get(email=options['email'])
+                        if options['email'] else AnonymousUser())
+        recipe_ids = list(RecipeViewSet.queryset.values_list(
+            'pk', flat=True)[:options['limit']])
+        renderer = JSONRenderer()
+
+        def serializer_path():
+            recipes = RecipeViewSet.queryset.filter(pk__in=recipe_ids)
+            recipes = sorted(recipes, key=lambda recipe: recipe_ids.index(
+                recipe.pk))
+            return renderer.render(RecipeGetSerializer(
+                recipes, many=True, context={'request': request}).data)
+
+        def projection_path():
+            return renderer.render(get_recipes_data(recipe_ids, request))
+
+        expected, actual = serializer_path(), projection_path()
+        if expected != actual:
+            raise CommandError(
+                f'Ответы различаются:\n{expected}\n{actual}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Ответы совпадают байт в байт ({len(recipe_ids)} рецептов).'))
+        for name, func in (('RecipeGetSerializer', serializer_path),
+                           ('get_recipes_data', projection_path)):
+            start = time.process_time()
+            for _ in range(options['repeat']):
+                func()
+            elapsed = (time.process_time() - start) / options['repeat']
+            self.stdout.write(f'{name}: {elapsed * 1000:.2f} мс CPU')
@@ -0,0 +1,88 @@
+import json
+import os
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def log_files(path, backup_count):
+    backups = (f'{path}.{number}' for number in range(backup_count, 0, -1))
+    return [name for name in (*backups, path) if os.path.exists(name)]
+
+
+def read_records(files, since):
+    for name in files:
+        with open(name, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record['time'] >= since:
+                    yield record
+
+
+class Command(BaseCommand):
+    help = ('Рейтинг отпечатков медленных SQL-запросов по суммарному '
+            'времени из журнала SLOW_QUERY_LOG')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Количество отпечатков в рейтинге'
+        )
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=0,
+            help='Учитывать только записи за последние N часов'
+        )
+        parser.add_argument(
+            '--plans',
+            action='store_true',
+            help='Показать сохраненные планы EXPLAIN'
+        )
+
+    def handle(self, *args, **options):
+        log = settings.SLOW_QUERY_LOG
+        since = time.time() - options['hours'] * 3600 if options[
+            'hours'] else 0
+        stats = defaultdict(lambda: {
+            'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'sql': '',
+            'plan': None, 'views': Counter(), 'call_sites': Counter(),
+        })
+        for record in read_records(
+                log_files(log['PATH'], log['BACKUP_COUNT']), since):
+            item = stats[record['fingerprint']]
+            item['calls'] += 1
+            item['total_ms'] += record['duration_ms']
+            item['max_ms'] = max(item['max_ms'], record['duration_ms'])
+            item['sql'] = record['sql']
+            item['plan'] = record.get('plan') or item['plan']
+            view = '.'.join(filter(None, (record['view'], record['action'])))
+            item['views'][view or '-'] += 1
+            item['call_sites'][record['call_site'] or '-'] += 1
+        if not stats:
+            self.stdout.write(self.style.NOTICE('Медленных запросов нет.'))
+            return
+        ranking = sorted(stats.items(), key=lambda item: item[1]['total_ms'],
+                         reverse=True)[:options['limit']]
+        for position, (key, item) in enumerate(ranking, 1):
+            self.stdout.write(self.style.SUCCESS(
+                f'{position}. {key}: {item["total_ms"]:.1f} мс всего, '
+                f'{item["calls"]} вызовов, '
+                f'{item["total_ms"] / item["calls"]:.1f} мс в среднем, '
+                f'{item["max_ms"]:.1f} мс максимум'))
+            self.stdout.write(f'   {item["sql"][:500]}')
+            for title, counter in (('представления', item['views']),
+                                   ('места вызова', item['call_sites'])):
+                self.stdout.write(f'   {title}: ' + ', '.join(
+                    f'{name} ({count})'
+                    for name, count in counter.most_common(3)))
+            if options['plans'] and item['plan']:
+                for line in item['plan'].splitlines():
+                    self.stdout.write(f'      {line}')
@@ -0,0 +1,89 @@
+import os
+
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки запроса',
+    ('view', 'action', 'method'),
+)
+RESPONSES = Counter(
+    'foodgram_http_responses_total',
+    'Ответы по кодам статуса',
+    ('view', 'action', 'status'),
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries_per_request',
+    'Количество SQL-запросов на один HTTP-запрос',
+    ('view', 'action'),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float('inf')),
+)
+DB_TIME = Histogram(
+    'foodgram_db_time_per_request_seconds',
+    'Суммарное время SQL-запросов на один HTTP-запрос',
+    ('view', 'action'),
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total',
+    'Обращения к кэшу',
+    ('cache', 'result'),
+)
+LOAD_SHEDDING = Counter(
+    'foodgram_load_shedding_total',
+    'Решения ограничителя нагрузки по классам эндпоинтов',
+    ('endpoint_class', 'decision'),
+)
+QUEUE_LATENCY = Histogram(
+    'foodgram_queue_latency_seconds',
+    'Время от приема запроса nginx до начала обработки',
+    ('endpoint_class',),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+             float('inf')),
+)
+IMAGE_QUEUE_DEPTH = Gauge(
+    'foodgram_image_processing_in_progress',
+    'Изображения, находящиеся в обработке',
+    multiprocess_mode='livesum',
+)
+JOBS_PENDING = Gauge(
+    'foodgram_jobs_pending',
+    'Фоновые задачи, ожидающие выполнения',
+    ('queue',),
+    multiprocess_mode='mostrecent',
+)
+IMPORT_ROWS = Counter(
+    'foodgram_import_rows_total',
+    'Строки, обработанные командами импорта',
+    ('command', 'status'),
+)
+IMPORT_DURATION = Histogram(
+    'foodgram_import_duration_seconds',
+    'Длительность команд импорта',
+    ('command',),
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, float('inf')),
+)
+
+SCRAPE_HOOKS = []
+
+
+def on_scrape(func):
+    SCRAPE_HOOKS.append(func)
+    return func
+
+
+def get_registry():
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_view(request):
+    for hook in SCRAPE_HOOKS:
+        hook()
+    return HttpResponse(generate_latest(get_registry()),
+                        content_type=CONTENT_TYPE_LATEST)
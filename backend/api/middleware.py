@@ -0,0 +1,171 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from rest_framework import status
+
+from .metrics import (DB_QUERIES, DB_TIME, LOAD_SHEDDING, QUEUE_LATENCY,
+                      REQUEST_LATENCY, RESPONSES)
+from .shedding import (OPTIONS, acquire_slot, endpoint_class, queue_latency,
+                       throttle_wait)
+
+UNMATCHED_VIEW = 'unmatched'
+# Источник SQL-запросов для журнала медленных запросов: HTTP-запрос
+# (представление и действие берутся из resolver_match) или строка вроде
+# task:recipes.purge_user.
+query_origin = ContextVar('query_origin', default=None)
+
+
+@contextmanager
+def origin(value):
+    token = query_origin.set(value)
+    try:
+        yield
+    finally:
+        query_origin.reset(token)
+
+
+def get_view_labels(request, view_func):
+    view_class = getattr(view_func, 'cls', None)
+    view = (view_class.__name__ if view_class is not None
+            else getattr(view_func, '__name__', UNMATCHED_VIEW))
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), '')
+    return view, action
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django распознает асинхронный middleware.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        start = time.perf_counter()
+        with origin(request), connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        view, action = self.observe(request, response, start)
+        DB_QUERIES.labels(view, action).observe(stats.count)
+        DB_TIME.labels(view, action).observe(stats.duration)
+        return response
+
+    async def __acall__(self, request):
+        # Запросы асинхронных представлений идут из пула потоков со своими
+        # соединениями, поэтому DB_QUERIES и DB_TIME здесь не считаются.
+        start = time.perf_counter()
+        with origin(request):
+            response = await self.get_response(request)
+        self.observe(request, response, start)
+        return response
+
+    def observe(self, request, response, start):
+        match = request.resolver_match
+        view, action = (get_view_labels(request, match.func) if match
+                        else (UNMATCHED_VIEW, ''))
+        REQUEST_LATENCY.labels(view, action, request.method).observe(
+            time.perf_counter() - start)
+        RESPONSES.labels(view, action, response.status_code).inc()
+        return view, action
+
+
+def reject(name, decision, status_code, retry_after, detail):
+    LOAD_SHEDDING.labels(name, decision).inc()
+    response = JsonResponse({'detail': detail}, status=status_code)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+class LoadSheddingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        rejection, release = self.admit(request)
+        if rejection is not None:
+            return rejection
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            release()
+            raise
+        return self.hold_until_closed(response, release)
+
+    async def __acall__(self, request):
+        rejection, release = self.admit(request)
+        if rejection is not None:
+            return rejection
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            release()
+            raise
+        return self.hold_until_closed(response, release)
+
+    @staticmethod
+    def hold_until_closed(response, release):
+        # Потоковые ответы (выгрузки, файлы) работают и после возврата из
+        # middleware, поэтому слот освобождается при закрытии ответа.
+        response._resource_closers.append(release)
+        return response
+
+    def admit(self, request):
+        if not OPTIONS['ENABLED']:
+            return None, lambda: None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None, lambda: None
+        request.resolver_match = match
+        name = endpoint_class(request, *get_view_labels(request, match.func))
+        latency = queue_latency(request)
+        if latency is not None:
+            QUEUE_LATENCY.labels(name).observe(latency)
+            if latency * 1000 > OPTIONS['CLASSES'][name]['MAX_QUEUE_MS']:
+                return reject(
+                    name, 'shed_queue', status.HTTP_503_SERVICE_UNAVAILABLE,
+                    OPTIONS['RETRY_AFTER'],
+                    'Сервер перегружен, повторите запрос позже.'), None
+        wait = throttle_wait(request)
+        if wait:
+            return reject(name, 'throttled',
+                          status.HTTP_429_TOO_MANY_REQUESTS, wait,
+                          'Слишком много запросов.'), None
+        release = acquire_slot(name)
+        if release is None:
+            return reject(
+                name, 'shed_concurrency', status.HTTP_503_SERVICE_UNAVAILABLE,
+                OPTIONS['RETRY_AFTER'],
+                'Сервер перегружен, повторите запрос позже.'), None
+        return None, release
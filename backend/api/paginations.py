@@ -1,6 +1,16 @@
 from rest_framework.pagination import PageNumberPagination
 
+from recipes.constants import MAX_PAGE_SIZE
+
 
 class ApiPagination(PageNumberPagination):
     page_size_query_param = "limit"
     page_size = 6
+    max_page_size = MAX_PAGE_SIZE
+
+    def is_oversized(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return False
+        return size > self.max_page_size
@@ -0,0 +1,193 @@
+from collections import defaultdict
+from functools import partial
+from operator import itemgetter
+
+from django.core.files.storage import default_storage
+from django.utils.encoding import filepath_to_uri
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from users.models import Subscription, User
+
+RECIPE_OUTPUT_FIELDS = ('id', 'tags', 'ingredients', 'author', 'name', 'text',
+                        'cooking_time', 'image', 'is_favorited',
+                        'is_in_shopping_cart')
+RECIPE_COLUMNS = {'author': 'author_id', 'name': 'name', 'text': 'text',
+                  'cooking_time': 'cooking_time', 'image': 'image'}
+AUTHOR_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name',
+                 'avatar')
+
+
+def media_base(request):
+    # Адрес каталога медиа строится один раз на ответ, а не для каждой
+    # картинки.
+    base = default_storage.url('')
+    if request is not None:
+        return request.build_absolute_uri(base)
+    return base
+
+
+def file_url(base, name):
+    if not name:
+        return None
+    return base + filepath_to_uri(name).lstrip('/')
+
+
+def user_recipe_ids(model, user, recipe_ids):
+    if not user.is_authenticated:
+        return set()
+    return set(model.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+
+
+def get_recipe_tags(recipe_ids):
+    tags = defaultdict(list)
+    rows = Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('tag_id').values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__slug')
+    for recipe_id, tag_id, name, slug in rows:
+        tags[recipe_id].append({'id': tag_id, 'name': name, 'slug': slug})
+    return tags
+
+
+def get_recipe_ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('id').values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount')
+    for recipe_id, ingredient_id, name, unit, amount in rows:
+        ingredients[recipe_id].append({
+            'id': ingredient_id,
+            'name': name,
+            'measurement_unit': unit,
+            'amount': amount,
+        })
+    return ingredients
+
+
+def get_authors(author_ids, request):
+    user = request.user
+    subscribed = set()
+    if user.is_authenticated:
+        subscribed = set(Subscription.objects.filter(
+            user=user, author_id__in=author_ids
+        ).values_list('author_id', flat=True))
+    authors = {}
+    base = media_base(request)
+    for row in User.objects.filter(pk__in=author_ids).values(
+            *AUTHOR_FIELDS):
+        row['avatar'] = file_url(base, row['avatar'])
+        row['is_subscribed'] = row['id'] in subscribed
+        authors[row['id']] = row
+    return authors
+
+
+def parse_projection(request):
+    params = request.query_params
+    requested, omitted = (
+        {name.strip() for name in params.get(key, '').split(',')
+         if name.strip()}
+        for key in ('fields', 'omit'))
+    unknown = (requested | omitted) - set(RECIPE_OUTPUT_FIELDS)
+    if unknown:
+        raise ValidationError(
+            {'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}'})
+    fields = tuple(
+        name for name in RECIPE_OUTPUT_FIELDS
+        if name == 'id' or (
+            (not requested or name in requested) and name not in omitted))
+    return fields, params.get('normalize') in ('1', 'true')
+
+
+def get_recipe_rows(recipe_ids, fields):
+    columns = ['id'] + [RECIPE_COLUMNS[name] for name in fields
+                        if name in RECIPE_COLUMNS]
+    return {
+        row['id']: row for row in Recipe.objects.filter(
+            pk__in=recipe_ids).values(*columns)
+    }
+
+
+def recipe_loaders(recipe_ids, request, fields):
+    # Независимые друг от друга запросы: асинхронный путь выполняет их
+    # параллельно, синхронный по очереди.
+    loaders = {'recipes': partial(get_recipe_rows, recipe_ids, fields)}
+    if 'tags' in fields:
+        loaders['tags'] = partial(get_recipe_tags, recipe_ids)
+    if 'ingredients' in fields:
+        loaders['ingredients'] = partial(get_recipe_ingredients, recipe_ids)
+    if 'is_favorited' in fields:
+        loaders['favorited'] = partial(
+            user_recipe_ids, Favorite, request.user, recipe_ids)
+    if 'is_in_shopping_cart' in fields:
+        loaders['in_cart'] = partial(
+            user_recipe_ids, ShoppingCart, request.user, recipe_ids)
+    return loaders
+
+
+def recipe_author_ids(parts):
+    return {row['author_id'] for row in parts['recipes'].values()}
+
+
+def assemble_recipes(recipe_ids, request, fields, sideload, parts):
+    recipes = parts['recipes']
+    values = {'id': lambda recipe_id, row: recipe_id}
+    included = {}
+    if 'tags' in fields:
+        tags = parts['tags']
+        if sideload:
+            included['tags'] = sorted(
+                {tag['id']: tag for recipe_tags in tags.values()
+                 for tag in recipe_tags}.values(),
+                key=itemgetter('id'))
+            values['tags'] = lambda recipe_id, row: [
+                tag['id'] for tag in tags[recipe_id]]
+        else:
+            values['tags'] = lambda recipe_id, row: tags[recipe_id]
+    if 'ingredients' in fields:
+        ingredients = parts['ingredients']
+        values['ingredients'] = lambda recipe_id, row: ingredients[recipe_id]
+    if 'author' in fields:
+        authors = parts['authors']
+        if sideload:
+            included['authors'] = list(authors.values())
+            values['author'] = lambda recipe_id, row: row['author_id']
+        else:
+            values['author'] = lambda recipe_id, row: authors[
+                row['author_id']]
+    for name in ('name', 'text', 'cooking_time'):
+        values[name] = lambda recipe_id, row, name=name: row[name]
+    base = media_base(request)
+    values['image'] = lambda recipe_id, row: file_url(base, row['image'])
+    if 'is_favorited' in fields:
+        favorited = parts['favorited']
+        values['is_favorited'] = lambda recipe_id, row: recipe_id in favorited
+    if 'is_in_shopping_cart' in fields:
+        in_cart = parts['in_cart']
+        values['is_in_shopping_cart'] = (
+            lambda recipe_id, row: recipe_id in in_cart)
+    return [
+        {name: values[name](recipe_id, recipes[recipe_id])
+         for name in fields}
+        for recipe_id in recipe_ids if recipe_id in recipes
+    ], included
+
+
+def build_recipes(recipe_ids, request, fields=RECIPE_OUTPUT_FIELDS,
+                  sideload=False):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return [], {}
+    parts = {name: load() for name, load in recipe_loaders(
+        recipe_ids, request, fields).items()}
+    if 'author' in fields:
+        parts['authors'] = get_authors(recipe_author_ids(parts), request)
+    return assemble_recipes(recipe_ids, request, fields, sideload, parts)
+
+
+def get_recipes_data(recipe_ids, request, fields=RECIPE_OUTPUT_FIELDS):
+    return build_recipes(recipe_ids, request, fields)[0]
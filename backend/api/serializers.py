@@ -1,12 +1,18 @@
+from django.db import transaction
 from djoser.serializers import UserSerializer as DjoserUserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
-from recipes.constants import MIN_VALUE_1
+from jobs.queue import enqueue
+from recipes.constants import (BATCH_MAX_ITEMS, BATCH_URL_PREFIX,
+                               CHANGES_LIMIT, CHANGES_MAX_LIMIT, MIN_VALUE_1,
+                               PANTRY_MAX_INGREDIENTS,
+                               PANTRY_MAX_RESULTS_LIMIT, PANTRY_RESULTS_LIMIT)
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, ShortLink, Tag)
 from users.models import Subscription, User
 
+from .fields import Base64ImageField
+
 
 class UserProfileSerializer(DjoserUserSerializer):
     is_subscribed = serializers.SerializerMethodField()
@@ -80,6 +86,42 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class PantrySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=MIN_VALUE_1),
+        allow_empty=False,
+        max_length=PANTRY_MAX_INGREDIENTS,
+    )
+    limit = serializers.IntegerField(
+        min_value=MIN_VALUE_1, max_value=PANTRY_MAX_RESULTS_LIMIT,
+        default=PANTRY_RESULTS_LIMIT,
+    )
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=BATCH_MAX_ITEMS,
+    )
+    parallel = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        for url in value:
+            if not url.startswith(BATCH_URL_PREFIX):
+                raise serializers.ValidationError(
+                    f'Адрес должен начинаться с {BATCH_URL_PREFIX}: {url}')
+        return value
+
+
+class ChangesQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(
+        min_value=MIN_VALUE_1, max_value=CHANGES_MAX_LIMIT,
+        default=CHANGES_LIMIT,
+    )
+
+
 class RecipeGetSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientGetSerializer(read_only=True, many=True,
                                                 source='recipe_ingredients')
@@ -128,25 +170,20 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                   'cooking_time', 'image')
 
     def validate(self, data):
-        ingredient = data.get('ingredient')
+        ingredient = data.get('recipe_ingredients')
         tags = data.get('tags')
-        if tags is None:
+        # При PATCH незаданные поля остаются прежними.
+        if tags is None and not self.partial:
             raise serializers.ValidationError(
                 {'tags': 'Поле tags не может быть пустым'})
-        if ingredient is None:
+        if ingredient is None and not self.partial:
             raise serializers.ValidationError(
                 {'ingredient': 'Поле ingredient не может быть пустым'})
-        if len(tags) != len(set(tags)):
+        if tags is not None and len(tags) != len(set(tags)):
             raise serializers.ValidationError(
                 {'tags': 'Теги не могут повторяться'})
-        invalid_tags = [tag_id for tag_id in tags
-                        if not Tag.objects.filter(id=tag_id).exists()]
-        if invalid_tags:
-            invalid_tags_str = ', '.join(map(str, invalid_tags))
-            raise serializers.ValidationError(
-                {'tags': f'Теги с id {invalid_tags_str} не существуют'})
         ingredients_list = []
-        for ing in ingredient:
+        for ing in ingredient or ():
             if ing['id'] in ingredients_list:
                 raise serializers.ValidationError(
                     {'ingredients': 'Ингредиент уже добавлен'})
@@ -156,12 +193,13 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                     {'ingredients': '''Количество ингредиента
                      должно быть больше 0'''})
             ing['amount'] = int(amount)
-            ingredients_list.append(ingredient['id'])
+            ingredients_list.append(ing['id'])
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
-        ingredient = validated_data.pop('ingredient')
+        ingredient = validated_data.pop('recipe_ingredients')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         recipe_ingredients = []
@@ -177,23 +215,28 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 )
             )
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        enqueue('recipes.optimize_image', recipe.id)
+        enqueue('recipes.update_neighbors', recipe.id)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        ingredient = validated_data.pop('ingredient')
         if 'tags' in validated_data:
             recipe.tags.set(validated_data.pop('tags'))
-        if 'ingredient' in validated_data:
-            recipe.ingredient.clear()
-        recipe_ingredients = [
-            RecipeIngredient(
-                ingredient=(ingredient['id']),
-                recipe=recipe,
-                amount=int(ingredient['amount'])
-            )
-            for ingredient in ingredient
-        ]
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        if 'recipe_ingredients' in validated_data:
+            recipe.recipe_ingredients.all().delete()
+            recipe_ingredients = [
+                RecipeIngredient(
+                    ingredient=(ingredient['id']),
+                    recipe=recipe,
+                    amount=int(ingredient['amount'])
+                )
+                for ingredient in validated_data.pop('recipe_ingredients')
+            ]
+            RecipeIngredient.objects.bulk_create(recipe_ingredients)
+            enqueue('recipes.update_neighbors', recipe.id)
+        if 'image' in validated_data:
+            enqueue('recipes.optimize_image', recipe.id)
         return super().update(recipe, validated_data)
 
     def to_representation(self, instance):
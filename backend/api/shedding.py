@@ -0,0 +1,169 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+
+from .metrics import LOAD_SHEDDING
+
+# Состояние общее для всех воркеров на хосте: слоты — файлы, занятые
+# через flock (блокировка снимается и при аварийном завершении процесса),
+# корзины токенов — записи в общем mmap-файле под lockf.
+
+
+class SlotPool:
+    def __init__(self, directory, name, size):
+        self.paths = [os.path.join(directory, f'{name}.{index}.slot')
+                      for index in range(size)]
+        self.pid = None
+        self.files = []
+        self.held = set()
+        self.lock = threading.Lock()
+
+    def open(self):
+        # flock принадлежит открытому файлу, а не процессу, поэтому после
+        # fork каждый воркер открывает файлы заново.
+        if self.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.paths[0]), exist_ok=True)
+            self.files = [open(path, 'a') for path in self.paths]
+            self.held = set()
+            self.pid = os.getpid()
+
+    def acquire(self):
+        with self.lock:
+            self.open()
+            for index, file in enumerate(self.files):
+                if index in self.held:
+                    continue
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                self.held.add(index)
+                return index
+        return None
+
+    def release(self, index):
+        with self.lock:
+            if self.pid == os.getpid() and index in self.held:
+                fcntl.flock(self.files[index], fcntl.LOCK_UN)
+                self.held.discard(index)
+
+
+class TokenBuckets:
+    BUCKET = struct.Struct('dd')
+
+    def __init__(self, path, count):
+        self.path = path
+        self.count = count
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        if self.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            size = self.BUCKET.size * self.count
+            if os.fstat(self.fd).st_size < size:
+                os.ftruncate(self.fd, size)
+            self.map = mmap.mmap(self.fd, size)
+            self.pid = os.getpid()
+
+    def take(self, key, rate, burst):
+        # Возвращает 0, если токен взят, иначе число секунд до появления
+        # следующего токена. Ключи с одинаковым хэшем делят корзину.
+        index = int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(),
+            'big') % self.count
+        offset = index * self.BUCKET.size
+        with self.lock:
+            self.open()
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, self.BUCKET.size, offset)
+            try:
+                tokens, updated = self.BUCKET.unpack_from(self.map, offset)
+                now = time.monotonic()
+                if updated == 0 or updated > now:
+                    tokens = burst
+                else:
+                    tokens = min(burst, tokens + (now - updated) * rate)
+                wait = 0 if tokens >= 1 else (1 - tokens) / rate
+                if not wait:
+                    tokens -= 1
+                self.BUCKET.pack_into(self.map, offset, tokens, now)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, self.BUCKET.size, offset)
+        return wait
+
+
+OPTIONS = settings.LOAD_SHEDDING
+SLOTS = {
+    name: SlotPool(OPTIONS['STATE_DIR'], name, options['CONCURRENCY'])
+    for name, options in OPTIONS['CLASSES'].items()
+}
+BUCKETS = TokenBuckets(os.path.join(OPTIONS['STATE_DIR'], 'buckets'),
+                       OPTIONS['BUCKETS'])
+
+
+def page_size(request):
+    try:
+        return int(request.GET.get('limit', 0))
+    except ValueError:
+        return 0
+
+
+def endpoint_class(request, view, action):
+    name = OPTIONS['ACTIONS'].get(f'{view}.{action}')
+    if name is not None:
+        return name
+    if (view, action) == ('RecipeViewSet', 'list') and (
+            page_size(request) > OPTIONS['LARGE_PAGE_SIZE']):
+        return OPTIONS['LARGE_PAGE_CLASS']
+    return 'default'
+
+
+def queue_latency(request):
+    # nginx передает время приема запроса: X-Request-Start: t=<секунды>.
+    value = request.META.get('HTTP_X_REQUEST_START', '')
+    try:
+        started = float(value[2:] if value.startswith('t=') else value)
+    except ValueError:
+        return None
+    return max(time.time() - started, 0)
+
+
+def client_keys(request):
+    keys = [('ip', request.META.get('HTTP_X_REAL_IP')
+             or request.META.get('REMOTE_ADDR', ''))]
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if authorization.startswith('Token '):
+        keys.append(('user', authorization[6:].strip()))
+    return keys
+
+
+def throttle_wait(request):
+    if not OPTIONS['ENABLED']:
+        return 0
+    wait = 0
+    for kind, key in client_keys(request):
+        rate = OPTIONS[f'{kind.upper()}_RATE']
+        if rate > 0:
+            wait = max(wait, BUCKETS.take(
+                f'{kind}:{key}', rate, OPTIONS[f'{kind.upper()}_BURST']))
+    return math.ceil(wait)
+
+
+def acquire_slot(name):
+    # Возвращает функцию, освобождающую слот, или None, если все слоты
+    # класса заняты.
+    if not OPTIONS['ENABLED']:
+        return lambda: None
+    slot = SLOTS[name].acquire()
+    if slot is None:
+        return None
+    LOAD_SHEDDING.labels(name, 'admitted').inc()
+    return lambda: SLOTS[name].release(slot)
@@ -0,0 +1,52 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, ShortLink, Tag
+from recipes.purge import recipes_deleted
+from users.models import User
+
+from .authentication import invalidate_tokens
+from .cache import facet_cache, ingredient_cache, short_link_cache, tag_cache
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields == frozenset(('last_login',)):
+        return
+    invalidate_tokens(*Token.objects.filter(
+        user_id=instance.pk).values_list('key', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    transaction.on_commit(tag_cache.invalidate)
+    transaction.on_commit(facet_cache.invalidate)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    transaction.on_commit(ingredient_cache.invalidate)
+
+
+@receiver(post_save, sender=ShortLink)
+@receiver(post_delete, sender=ShortLink)
+def short_link_changed(sender, **kwargs):
+    transaction.on_commit(short_link_cache.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(recipes_deleted, sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_changed(sender, **kwargs):
+    transaction.on_commit(facet_cache.invalidate)
@@ -0,0 +1,175 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .middleware import UNMATCHED_VIEW, get_view_labels, query_origin
+
+PLAN_KEY = 'slow_queries:plan:{}'
+explaining = ContextVar('explaining', default=False)
+
+NORMALIZE_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+PROJECT_DIR = str(settings.BASE_DIR)
+STACK_DEPTH = 5
+
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    # Файл пишут все воркеры: запись и ротация идут под flock, а после
+    # чужой ротации поток переоткрывается.
+    def emit(self, record):
+        with open(f'{self.baseFilename}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.stream is not None and self.rotated():
+                self.stream.close()
+                self.stream = None
+            super().emit(record)
+
+    def rotated(self):
+        try:
+            return (os.stat(self.baseFilename).st_ino
+                    != os.fstat(self.stream.fileno()).st_ino)
+        except FileNotFoundError:
+            return True
+
+
+def get_log():
+    options = settings.SLOW_QUERY_LOG
+    log = logging.getLogger('foodgram.slow_queries')
+    if not log.handlers:
+        os.makedirs(os.path.dirname(options['PATH']), exist_ok=True)
+        log.addHandler(SharedRotatingFileHandler(
+            options['PATH'], maxBytes=options['MAX_BYTES'],
+            backupCount=options['BACKUP_COUNT'], encoding='utf-8',
+            delay=True))
+        log.setLevel(logging.INFO)
+        log.propagate = False
+    return log
+
+
+def normalize(sql):
+    for pattern, replacement in NORMALIZE_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.md5(normalized_sql.encode()).hexdigest()[:16]
+
+
+def frame_name(frame):
+    code = frame.f_code
+    qualname = getattr(code, 'co_qualname', None)
+    if qualname is None:
+        owner = frame.f_locals.get('self')
+        qualname = (f'{type(owner).__name__}.{code.co_name}'
+                    if owner is not None else code.co_name)
+    path = os.path.relpath(code.co_filename, PROJECT_DIR)
+    return f'{path}:{frame.f_lineno} {qualname}'
+
+
+def project_stack():
+    stack = []
+    frame = sys._getframe(2)
+    while frame is not None and len(stack) < STACK_DEPTH:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(PROJECT_DIR) and filename != __file__
+                and 'site-packages' not in filename):
+            stack.append(frame_name(frame))
+        frame = frame.f_back
+    return stack
+
+
+def describe_origin():
+    origin = query_origin.get()
+    if origin is None:
+        return {'view': '', 'action': ''}
+    if isinstance(origin, str):
+        return {'view': origin, 'action': ''}
+    match = getattr(origin, 'resolver_match', None)
+    view, action = (get_view_labels(origin, match.func) if match
+                    else (UNMATCHED_VIEW, ''))
+    return {'view': view, 'action': action, 'path': origin.path}
+
+
+def explain(connection, sql, params):
+    # Простой EXPLAIN не выполняет запрос. Ошибка в транзакции PostgreSQL
+    # откатывается до точки сохранения и не ломает исходную транзакцию.
+    if connection.needs_rollback:
+        return None
+    token = explaining.set(True)
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'{connection.ops.explain_query_prefix()} {sql}', params)
+                return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    except DatabaseError as error:
+        return f'EXPLAIN не удался: {error}'
+    finally:
+        explaining.reset(token)
+
+
+def slow_query_logger(execute, sql, params, many, context):
+    if explaining.get():
+        return execute(sql, params, many, context)
+    options = settings.SLOW_QUERY_LOG
+    start = time.perf_counter()
+    failed = True
+    try:
+        result = execute(sql, params, many, context)
+        failed = False
+        return result
+    finally:
+        duration = (time.perf_counter() - start) * 1000
+        if duration >= options['THRESHOLD_MS']:
+            connection = context['connection']
+            normalized = normalize(sql)
+            key = fingerprint(normalized)
+            stack = project_stack()
+            record = {
+                'time': time.time(),
+                'fingerprint': key,
+                'duration_ms': round(duration, 3),
+                'sql': normalized,
+                'call_site': stack[0] if stack else '',
+                'stack': stack,
+                'database': connection.alias,
+                'pid': os.getpid(),
+                'failed': failed,
+                **describe_origin(),
+            }
+            if (options['EXPLAIN'] and not failed and not many
+                    and normalized.upper().startswith(EXPLAINABLE)
+                    and cache.add(PLAN_KEY.format(key), True,
+                                  options['EXPLAIN_TTL'])):
+                record['plan'] = explain(connection, sql, params)
+            get_log().info(json.dumps(record, ensure_ascii=False))
+
+
+@receiver(connection_created)
+def install_slow_query_logger(sender, connection, **kwargs):
+    if (settings.SLOW_QUERY_LOG['THRESHOLD_MS'] > 0
+            and slow_query_logger not in connection.execute_wrappers):
+        # В начало списка: execute_wrapper() снимает последний элемент, а
+        # соединение может открыться внутри такого блока.
+        connection.execute_wrappers.insert(0, slow_query_logger)
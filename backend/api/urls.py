@@ -1,9 +1,9 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from .views import (BatchView, ChangesView, IngredientViewSet, RecipeViewSet,
+                    TagViewSet, UserViewSet)
 
 router_v1 = DefaultRouter()
 
@@ -18,7 +18,21 @@ router_v1.register(r'ingredients', IngredientViewSet,
 
 
 urlpatterns = [
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('changes/', ChangesView.as_view(), name='changes'),
     path('', include(router_v1.urls)),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+        path('tags/', async_views.tag_list),
+        path('tags/<int:pk>/', async_views.tag_detail),
+        path('ingredients/', async_views.ingredient_list),
+        path('ingredients/<int:pk>/', async_views.ingredient_detail),
+    ] + urlpatterns
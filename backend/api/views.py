@@ -1,38 +1,60 @@
-import os
-import tempfile
+from functools import partial
 
-from django.db.models import Count, Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import Count, Prefetch, Sum
+from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils.cache import patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUser
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from changes.feed import compacted_through, visible_changes
+from recipes.constants import (SIMILAR_RECIPES_LIMIT, TRENDING_LIMIT,
+                               TRENDING_MAX_LIMIT)
+from recipes.counters import view_counter
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, ShortLink, Tag)
+                            RecipeNeighbor, RecipeStats, ShoppingCart,
+                            ShortLink, Tag)
+from recipes.pantry import rank_recipes
+from recipes.purge import soft_delete_recipes, soft_delete_user
 from users.models import Subscription, User
 
+from .batch import run_batch
+from .cache import ingredient_cache, tag_cache
+from .conditional import (check_if_match, etag_headers, get_recipe_etag,
+                          if_none_match)
+from .downloads import protected_response, shopping_list_name, write_protected
+from .export import ndjson_response, recipe_rows, user_export_rows
+from .facets import get_facets, parse_facets
 from .filters import IngredientFilter, RecipeFilter
 from .paginations import ApiPagination
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (AvatarSerializer, FavoriteSerializer,
-                          IngredientSerializer, RecipeCreateSerializer,
-                          RecipeGetSerializer, ShoppingCartSerializer,
+from .projections import build_recipes, get_recipes_data, parse_projection
+from .serializers import (AvatarSerializer, BatchSerializer,
+                          ChangesQuerySerializer, FavoriteSerializer,
+                          IngredientSerializer, PantrySerializer,
+                          RecipeCreateSerializer, RecipeGetSerializer,
+                          RecipeShortSerializer, ShoppingCartSerializer,
                           SubscriptionCreateSerializer,
                           SubscriptionGetSerializer, TagSerializer,
                           UserProfileSerializer)
 
 
 class UserViewSet(DjoserUser):
-    queryset = User.objects.all()
+    queryset = User.objects.filter(is_active=True)
     serializer_class = UserProfileSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = LimitOffsetPagination
 
+    def perform_destroy(self, instance):
+        soft_delete_user(instance)
+
     @action(detail=False,
             methods=('get',),
             permission_classes=[permissions.IsAuthenticated])
@@ -41,6 +63,17 @@ class UserViewSet(DjoserUser):
         serializer = UserProfileSerializer(user, context={'request': request})
         return Response(serializer.data)
 
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='me/export',
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def export(self, request):
+        return ndjson_response(user_export_rows(request.user, request),
+                               f'foodgram-{request.user.username}.ndjson',
+                               request)
+
     @action(
         detail=False,
         methods=('put',),
@@ -115,7 +148,8 @@ class UserViewSet(DjoserUser):
         permission_classes=(permissions.IsAuthenticated,),
     )
     def subscriptions(self, request):
-        authors = User.objects.filter(subscribers__user=request.user)
+        authors = User.objects.filter(subscribers__user=request.user,
+                                      is_active=True)
         authors = authors.annotate(recipe_count=Count('recipes'))
         page = self.paginate_queryset(authors)
         if page is not None:
@@ -139,7 +173,10 @@ def create_entry(serializer_class, user, recipe_pk, context=None):
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.select_related('author').prefetch_related(
-        'tags', 'ingredient'
+        Prefetch('tags', queryset=Tag.objects.order_by('id')),
+        Prefetch('recipe_ingredients',
+                 queryset=RecipeIngredient.objects.select_related(
+                     'ingredient').order_by('id')),
     )
     permission_classes = (IsAuthorOrReadOnly,
                           permissions.IsAuthenticatedOrReadOnly)
@@ -152,19 +189,168 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeGetSerializer
         return RecipeCreateSerializer
 
+    def list(self, request, *args, **kwargs):
+        if self.paginator.is_oversized(request):
+            params = request.query_params.copy()
+            for name in (self.paginator.page_query_param,
+                         self.paginator.page_size_query_param):
+                params.pop(name, None)
+            url = reverse('recipe-export')
+            return HttpResponseRedirect(
+                f'{url}?{params.urlencode()}' if params else url)
+        facets = parse_facets(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        recipe_ids = queryset.prefetch_related(None).values_list(
+            'pk', flat=True)
+        fields, sideload = parse_projection(request)
+        page = self.paginate_queryset(recipe_ids)
+        if page is None:
+            data, included = build_recipes(
+                recipe_ids, request, fields, sideload)
+            if facets:
+                included['facets'] = get_facets(request, facets)
+            return Response({'results': data, **included} if included
+                            else data)
+        data, included = build_recipes(page, request, fields, sideload)
+        if facets:
+            included['facets'] = get_facets(request, facets)
+        response = self.get_paginated_response(data)
+        response.data.update(included)
+        return response
+
+    def get_recipe_id(self):
+        try:
+            return int(self.kwargs['pk'])
+        except ValueError:
+            raise Http404
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe_id = self.get_recipe_id()
+        etag = get_recipe_etag(recipe_id, request.user)
+        if etag is None:
+            raise Http404
+        view_counter.record(recipe_id)
+        if if_none_match(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers=etag_headers(etag))
+        fields, _ = parse_projection(request)
+        data = get_recipes_data([recipe_id], request, fields)
+        if not data:
+            raise Http404
+        return Response(data[0], headers=etag_headers(etag))
+
+    def update(self, request, *args, **kwargs):
+        recipe_id = self.get_recipe_id()
+        with transaction.atomic():
+            etag = get_recipe_etag(recipe_id, request.user, lock=True)
+            if etag is None:
+                raise Http404
+            check_if_match(request, etag)
+            response = super().update(request, *args, **kwargs)
+        response['ETag'] = get_recipe_etag(recipe_id, request.user)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def destroy(self, request, *args, **kwargs):
+        recipe_id = self.get_recipe_id()
+        with transaction.atomic():
+            etag = get_recipe_etag(recipe_id, request.user, lock=True)
+            if etag is None:
+                raise Http404
+            check_if_match(request, etag)
+            return super().destroy(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        soft_delete_recipes(Recipe.objects.filter(pk=instance.pk))
+
+    @action(
+        detail=True,
+        methods=('get',),
+        url_path='similar',
+    )
+    def similar(self, request, pk=None):
+        neighbors = RecipeNeighbor.objects.filter(
+            recipe_id=self.get_recipe_id(), neighbor__is_deleted=False
+        ).select_related('neighbor').order_by(
+            '-score')[:SIMILAR_RECIPES_LIMIT]
+        serializer = RecipeShortSerializer(
+            [neighbor.neighbor for neighbor in neighbors], many=True,
+            context={'request': request})
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='export',
+    )
+    def export(self, request):
+        fields, _ = parse_projection(request)
+        queryset = self.filter_queryset(
+            Recipe.objects.order_by('pub_date', 'pk'))
+        return ndjson_response(recipe_rows(queryset, request, fields),
+                               'foodgram-recipes.ndjson', request)
+
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='trending',
+    )
+    def trending(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', TRENDING_LIMIT)),
+                        TRENDING_MAX_LIMIT)
+        except ValueError:
+            limit = TRENDING_LIMIT
+        recipes = self.filter_queryset(Recipe.objects.all())
+        recipe_ids = RecipeStats.objects.filter(
+            trending_score__gt=0, recipe__in=recipes.values('pk')
+        ).order_by('-trending_score').values_list(
+            'recipe_id', flat=True)[:max(limit, 0)]
+        fields, _ = parse_projection(request)
+        return Response(get_recipes_data(list(recipe_ids), request, fields))
+
+    @action(
+        detail=False,
+        methods=('post',),
+        url_path='by-ingredients',
+        permission_classes=(permissions.AllowAny,),
+    )
+    def by_ingredients(self, request):
+        serializer = PantrySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ranked = rank_recipes(serializer.validated_data['ingredients'],
+                              serializer.validated_data['limit'])
+        recipes = Recipe.objects.in_bulk(
+            [recipe_id for recipe_id, _, _ in ranked])
+        data = []
+        for recipe_id, covered, missing in ranked:
+            if recipe_id not in recipes:
+                continue
+            item = RecipeShortSerializer(
+                recipes[recipe_id], context={'request': request}).data
+            item['covered'] = covered
+            item['missing'] = missing
+            data.append(item)
+        return Response(data)
+
     @action(
         detail=True,
         methods=('post', 'get'),
         url_path='get-link'
     )
     def get_link(self, request, pk=None):
+        recipe = get_object_or_404(Recipe, pk=pk)
         url = request.build_absolute_uri(
-            reverse('recipe-detail', args=[pk])
+            reverse('recipe-detail', args=[recipe.pk])
         ).replace('/api', '')
-        short_link, created = ShortLink.objects.get_or_create(original_url=url)
+        short_link, created = ShortLink.objects.get_or_create(
+            original_url=url, defaults={'recipe': recipe})
+        if short_link.recipe_id is None:
+            short_link.recipe = recipe
+            short_link.save(update_fields=('recipe',))
         base_url = request.build_absolute_uri('/s/').rstrip('/')
         return Response({'short-link': f'{base_url}/{short_link.short_code}'})
 
@@ -194,37 +380,28 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False,
         methods=('get',),
         url_path='download_shopping_cart',
+        permission_classes=(permissions.IsAuthenticated,)
     )
     def download_shopping_cart(self, request):
         ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_carts__user=request.user
+            recipe__shoppingcarts__user=request.user,
+            recipe__is_deleted=False,
         ).values(
-            'ingredients__name', 'ingredients__measurement_unit').annotate(
+            'ingredient__name', 'ingredient__measurement_unit').annotate(
                 total_amount=Sum('amount')
-        ).order_by('ingredients__name')
-        ingredients_text = self.format_ingredients_text(ingredients)
-        with tempfile.NamedTemporaryFile(
-            delete=False, mode='w', encoding='utf-8'
-        ) as temp_file:
-            temp_file.write(ingredients_text)
-            temp_file_path = temp_file.name
-        response = FileResponse(open(
-            temp_file_path, 'rb'
-        ), content_type='text/plain')
-        response[
-            'Content-Disposition'
-        ] = 'attachment; filename="shopping_cart.txt"'
-        response['X-Accel-Buffering'] = 'no'
-        response['Content-Length'] = os.path.getsize(temp_file_path)
-        os.remove(temp_file_path)
-        return response
+        ).order_by('ingredient__name')
+        name = shopping_list_name(request.user.pk)
+        write_protected(
+            name, self.format_ingredients_text(ingredients).encode())
+        return protected_response(name, 'shopping_cart.txt',
+                                  'text/plain; charset=utf-8')
 
     @staticmethod
     def format_ingredients_text(ingredients):
         ingredients_text = "Список покупок:\n\n"
         for ingredient in ingredients:
-            ingredient_name = ingredient['ingredients__name']
-            measurement_unit = ingredient['ingredients__measurement_unit']
+            ingredient_name = ingredient['ingredient__name']
+            measurement_unit = ingredient['ingredient__measurement_unit']
             total_amount = ingredient['total_amount']
             ingredients_text += (
                 f"{ingredient_name} ({measurement_unit}) - {total_amount}\n"
@@ -253,10 +430,79 @@ class RecipeViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class BatchView(APIView):
+    permission_classes = (permissions.AllowAny,)
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(run_batch(request, **serializer.validated_data))
+
+
+class ChangesView(APIView):
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request):
+        serializer = ChangesQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        since = serializer.validated_data['since']
+        limit = serializer.validated_data['limit']
+        through = compacted_through()
+        if through is not None and since < through:
+            return Response({
+                'detail': 'Журнал изменений сжат, нужна полная '
+                          'синхронизация.',
+                'since': through,
+            }, status=status.HTTP_410_GONE)
+        changes = visible_changes(request.user, since, limit + 1)
+        results = [
+            {'seq': change['seq'], 'model': change['model'],
+             'id': change['object_id'], 'action': change['action']}
+            for change in changes[:limit]
+        ]
+        return Response({
+            'results': results,
+            'next': results[-1]['seq'] if results else since,
+            'has_more': len(changes) > limit,
+        })
+
+
+def serialize_tags(pk=None):
+    if pk is None:
+        return TagSerializer(Tag.objects.all(), many=True).data
+    return TagSerializer(get_object_or_404(Tag, pk=pk)).data
+
+
+def get_tags_data(pk=None):
+    return tag_cache.get_or_set('list' if pk is None else f'detail:{pk}',
+                                partial(serialize_tags, pk))
+
+
+def serialize_ingredients(name='', pk=None):
+    if pk is not None:
+        return IngredientSerializer(
+            get_object_or_404(Ingredient, pk=pk)).data
+    return IngredientSerializer(IngredientFilter(
+        {'name': name}, queryset=Ingredient.objects.all()).qs, many=True).data
+
+
+def get_ingredients_data(name='', pk=None):
+    return ingredient_cache.get_or_set(
+        f'list:{name}' if pk is None else f'detail:{pk}',
+        partial(serialize_ingredients, name, pk))
+
+
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    lookup_value_regex = r'\d+'
+
+    def list(self, request, *args, **kwargs):
+        return Response(get_tags_data())
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(get_tags_data(int(kwargs['pk'])))
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -265,3 +511,11 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
+    lookup_value_regex = r'\d+'
+
+    def list(self, request, *args, **kwargs):
+        return Response(get_ingredients_data(
+            request.query_params.get('name', '')))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(get_ingredients_data(pk=int(kwargs['pk'])))
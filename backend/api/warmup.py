@@ -0,0 +1,30 @@
+import logging
+
+from django.apps import apps
+from django.db import DatabaseError, connections
+from django.urls import URLResolver, get_resolver
+
+from recipes.catalog import get_tag_catalog
+
+logger = logging.getLogger(__name__)
+
+
+def warm_urls(resolver):
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            warm_urls(pattern)
+
+
+def warm_up():
+    # Вызывается в мастере gunicorn до fork (preload_app) или в каждом
+    # воркере после загрузки приложения.
+    for model in apps.get_models():
+        model._meta.get_fields()
+    warm_urls(get_resolver())
+    try:
+        get_tag_catalog()
+    except DatabaseError:
+        logger.warning('Прогрев каталога тегов пропущен: БД недоступна')
+    connections.close_all()
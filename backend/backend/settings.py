@@ -29,6 +29,8 @@ INSTALLED_APPS = [
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
+    'changes.apps.ChangesConfig',
 ]
 
 REST_FRAMEWORK = {
@@ -37,12 +39,46 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
 }
 
+# Другие воркеры gunicorn видят выход из системы, смену пароля и
+# блокировку пользователя не позже чем через TTL секунд.
+TOKEN_AUTH_CACHE = {
+    'MAXSIZE': int(os.getenv('TOKEN_AUTH_CACHE_MAXSIZE', 10000)),
+    'TTL': int(os.getenv('TOKEN_AUTH_CACHE_TTL', 15)),
+    'SHARED_CACHE': os.getenv('TOKEN_AUTH_SHARED_CACHE'),
+    'SHARED_TTL': int(os.getenv('TOKEN_AUTH_SHARED_TTL', 15)),
+}
+
+# Общий для всех воркеров на хосте кэш: каталог тегов, поколение индекса
+# кладовой и второй уровень TwoTierCache.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/foodgram_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+}
+
+# Записи свежи TTL секунд, еще STALE_TTL секунд отдаются устаревшими и
+# обновляются в фоне. После инвалидации другие воркеры перестают отдавать
+# старые данные не позже чем через VERSION_TTL секунд.
+TWO_TIER_CACHE = {
+    'MAXSIZE': int(os.getenv('TWO_TIER_CACHE_MAXSIZE', 1000)),
+    'TTL': int(os.getenv('TWO_TIER_CACHE_TTL', 300)),
+    'STALE_TTL': int(os.getenv('TWO_TIER_CACHE_STALE_TTL', 3600)),
+    'VERSION_TTL': float(os.getenv('TWO_TIER_CACHE_VERSION_TTL', 1)),
+    'SHARED_CACHE': os.getenv('TWO_TIER_SHARED_CACHE', 'default'),
+}
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
@@ -58,6 +94,8 @@ DJOSER = {
 }
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.LoadSheddingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,6 +127,13 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# wsgi: синхронные воркеры gunicorn; asgi: воркеры uvicorn и асинхронные
+# представления для чтения рецептов, тегов, ингредиентов и коротких ссылок.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+ASYNC_READ_VIEWS = SERVER_MODE == 'asgi'
+# Потоков (и соединений с БД) для асинхронных представлений на воркер.
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', 8))
+
 # if os.getenv('USE_PGSQL', False) is True:
 DATABASES = {
     'default': {
@@ -97,7 +142,9 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv(
+            'DB_CONN_MAX_AGE', 60 if ASYNC_READ_VIEWS else 0)),
     }
 }
 # else:
@@ -139,5 +186,76 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 
 MEDIA_ROOT = BASE_DIR / 'media'
 MEDIA_URL = '/media/'
+DEFAULT_FILE_STORAGE = 'backend.storage.HashedMediaStorage'
+
+# Файлы с контролем доступа (списки покупок) лежат вне MEDIA_ROOT и
+# отдаются nginx из internal location /protected/ по X-Accel-Redirect.
+PROTECTED_ROOT = os.getenv('PROTECTED_ROOT', BASE_DIR / 'protected')
+PROTECTED_URL = '/protected/'
+USE_X_ACCEL_REDIRECT = os.getenv(
+    'USE_X_ACCEL_REDIRECT', str(not DEBUG)) == 'True'
+
+# Страницы /s/<code>/ с OpenGraph-разметкой, nginx отдает их отсюда.
+SHARE_PAGES_ROOT = os.getenv('SHARE_PAGES_ROOT', BASE_DIR / 'share_pages')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 48))
+VIEW_COUNTER_FLUSH_INTERVAL = float(
+    os.getenv('VIEW_COUNTER_FLUSH_INTERVAL', 10))
+
+CHANGES_RETENTION_DAYS = int(os.getenv('CHANGES_RETENTION_DAYS', 30))
+
+# SQL-запросы дольше THRESHOLD_MS миллисекунд (0 отключает журнал)
+# пишутся в PATH вместе с местом вызова и представлением; план EXPLAIN
+# снимается один раз на отпечаток запроса за EXPLAIN_TTL секунд.
+SLOW_QUERY_LOG = {
+    'THRESHOLD_MS': float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200)),
+    'PATH': os.getenv('SLOW_QUERY_LOG_PATH',
+                      '/tmp/foodgram_slow_queries/slow_queries.jsonl'),
+    'MAX_BYTES': int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+    'BACKUP_COUNT': int(os.getenv('SLOW_QUERY_LOG_BACKUP_COUNT', 5)),
+    'EXPLAIN': os.getenv('SLOW_QUERY_EXPLAIN', 'True') == 'True',
+    'EXPLAIN_TTL': int(os.getenv('SLOW_QUERY_EXPLAIN_TTL', 86400)),
+}
+
+# Ограничение нагрузки. CONCURRENCY — одновременных запросов класса на
+# хост, MAX_QUEUE_MS — сколько запрос может ждать в очереди (по заголовку
+# X-Request-Start от nginx), прежде чем получит 503. Тяжелые запросы
+# отбрасываются раньше, чтобы дешевые не стояли за ними. Корзины токенов
+# ограничивают частоту запросов с одного IP и по одному токену.
+LOAD_SHEDDING = {
+    'ENABLED': os.getenv('LOAD_SHEDDING', 'True') == 'True',
+    'STATE_DIR': os.getenv('LOAD_SHEDDING_DIR', '/tmp/foodgram_shedding'),
+    'CLASSES': {
+        'heavy': {
+            'CONCURRENCY': int(os.getenv('HEAVY_CONCURRENCY', 2)),
+            'MAX_QUEUE_MS': int(os.getenv('HEAVY_MAX_QUEUE_MS', 250)),
+        },
+        'default': {
+            'CONCURRENCY': int(os.getenv('DEFAULT_CONCURRENCY', 64)),
+            'MAX_QUEUE_MS': int(os.getenv('DEFAULT_MAX_QUEUE_MS', 2000)),
+        },
+    },
+    # <Представление>.<действие> -> класс.
+    'ACTIONS': {
+        'RecipeViewSet.download_shopping_cart': 'heavy',
+        'RecipeViewSet.export': 'heavy',
+        'UserViewSet.export': 'heavy',
+        'IngredientViewSet.list': 'heavy',
+    },
+    'LARGE_PAGE_SIZE': int(os.getenv('LARGE_PAGE_SIZE', 24)),
+    'LARGE_PAGE_CLASS': 'heavy',
+    'IP_RATE': float(os.getenv('THROTTLE_IP_RATE', 20)),
+    'IP_BURST': float(os.getenv('THROTTLE_IP_BURST', 80)),
+    'USER_RATE': float(os.getenv('THROTTLE_USER_RATE', 10)),
+    'USER_BURST': float(os.getenv('THROTTLE_USER_BURST', 40)),
+    'BUCKETS': 65536,
+    'RETRY_AFTER': int(os.getenv('LOAD_SHEDDING_RETRY_AFTER', 1)),
+}
+
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'False') == 'True'
+JOBS_WORKER_THREADS = int(os.getenv('JOBS_WORKER_THREADS', 4))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+JOBS_RETRY_BACKOFF = int(os.getenv('JOBS_RETRY_BACKOFF', 5))
+JOBS_STALE_AFTER = int(os.getenv('JOBS_STALE_AFTER', 600))
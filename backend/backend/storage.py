@@ -0,0 +1,24 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+
+HASH_LENGTH = 12
+HASH_SUFFIX = re.compile(r'\.[0-9a-f]{12}$')
+
+
+class HashedMediaStorage(FileSystemStorage):
+    # Имя файла содержит хэш содержимого: файл по одному адресу никогда не
+    # меняется, поэтому nginx отдает медиа с бессрочным кэшированием.
+    # Новое содержимое всегда сохраняется под новым именем.
+    def save(self, name, content, max_length=None):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        root, ext = os.path.splitext(name)
+        root = HASH_SUFFIX.sub('', root)
+        return super().save(
+            f'{root}.{digest.hexdigest()[:HASH_LENGTH]}{ext}', content,
+            max_length)
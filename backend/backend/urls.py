@@ -3,11 +3,15 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from recipes.views import redirect_to_recipe
+from api.metrics import metrics_view
+from recipes.views import share_recipe, share_recipe_async
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('s/<str:code>/', redirect_to_recipe,
+    path('metrics', metrics_view, name='metrics'),
+    path('s/<str:code>/', (share_recipe_async
+                           if settings.ASYNC_READ_VIEWS
+                           else share_recipe),
          name='redirect-to-recipe'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
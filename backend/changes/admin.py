@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from .models import Change, Compaction
+
+
+@admin.register(Change)
+class ChangeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'seq', 'model', 'object_id', 'action', 'user',
+                    'created_at')
+    list_filter = ('model', 'action')
+    search_fields = ('object_id',)
+    raw_id_fields = ('user',)
+    show_full_result_count = False
+
+
+@admin.register(Compaction)
+class CompactionAdmin(admin.ModelAdmin):
+    list_display = ('through', 'created_at')
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ChangesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'changes'
+    verbose_name = 'Журнал изменений'
+
+    def ready(self):
+        from changes import signals  # noqa: F401
@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models import F, Max, Min, Q
+
+from changes.models import Change, ChangeSequence, Compaction
+
+
+def compacted_through():
+    return Compaction.objects.aggregate(through=Max('through'))['through']
+
+
+@transaction.atomic
+def publish_changes():
+    # Под блокировкой счетчика seq получают только закоммиченные записи,
+    # поэтому запись из долгой транзакции получит номер больше всех, что
+    # клиенты уже видели, и не будет пропущена. Номера идут с пропусками:
+    # seq = id + сдвиг, одно UPDATE на все новые записи.
+    ChangeSequence.objects.get_or_create(pk=1)
+    sequence = ChangeSequence.objects.select_for_update().get(pk=1)
+    bounds = Change.objects.filter(seq__isnull=True).aggregate(
+        first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return sequence.last
+    offset = sequence.last - bounds['first'] + 1
+    Change.objects.filter(seq__isnull=True, id__lte=bounds['last']).update(
+        seq=F('id') + offset)
+    sequence.last = bounds['last'] + offset
+    sequence.save(update_fields=('last',))
+    return sequence.last
+
+
+def visible_changes(user, since, limit):
+    if Change.objects.filter(seq__isnull=True).exists():
+        publish_changes()
+    visible = Q(user__isnull=True)
+    if user.is_authenticated:
+        visible |= Q(user=user)
+    return list(Change.objects.filter(
+        visible, seq__gt=since
+    ).order_by('seq').values('seq', 'model', 'object_id', 'action')[:limit])
@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils.timezone import now
+
+from changes.feed import publish_changes
+from changes.models import Change, Compaction
+
+
+class Command(BaseCommand):
+    help = ('Сжатие журнала изменений: удаление записей, перекрытых более '
+            'новыми, и записей старше срока хранения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.CHANGES_RETENTION_DAYS,
+            help='Срок хранения журнала, дней'
+        )
+
+    def handle(self, *args, **options):
+        publish_changes()
+        superseded = 0
+        for audience, newer in (
+            (Q(user__isnull=True), Change.objects.filter(user__isnull=True)),
+            (Q(user__isnull=False),
+             Change.objects.filter(user=OuterRef('user'))),
+        ):
+            superseded += Change.objects.filter(
+                audience, seq__isnull=False
+            ).filter(Exists(newer.filter(
+                model=OuterRef('model'), object_id=OuterRef('object_id'),
+                seq__gt=OuterRef('seq')))).delete()[0]
+        self.stdout.write(f'Удалено перекрытых изменений: {superseded}')
+
+        expired = now() - timedelta(days=options['days'])
+        with transaction.atomic():
+            through = Change.objects.filter(
+                created_at__lt=expired).aggregate(
+                through=Max('seq'))['through']
+            if through is None:
+                return
+            deleted = Change.objects.filter(seq__lte=through).delete()[0]
+            Compaction.objects.create(through=through)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено устаревших изменений: {deleted} (до #{through})'))
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Compaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('through', models.BigIntegerField(verbose_name='Удалены изменения до номера')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Выполнено')),
+            ],
+            options={
+                'verbose_name': 'сжатие журнала',
+                'verbose_name_plural': 'Сжатия журнала',
+                'ordering': ('-through',),
+            },
+        ),
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='Номер')),
+                ('model', models.CharField(max_length=32, verbose_name='Модель')),
+                ('object_id', models.BigIntegerField(verbose_name='Объект')),
+                ('action', models.CharField(choices=[('upsert', 'Создание или изменение'), ('delete', 'Удаление')], max_length=32, verbose_name='Действие')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Создано')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='changes', to=settings.AUTH_USER_MODEL, verbose_name='Виден только пользователю')),
+            ],
+            options={
+                'verbose_name': 'изменение',
+                'verbose_name_plural': 'Изменения',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['model', 'object_id'], name='change_object_idx'),
+        ),
+    ]
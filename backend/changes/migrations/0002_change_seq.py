@@ -0,0 +1,45 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:23
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def fill_seq(apps, schema_editor):
+    Change = apps.get_model('changes', 'Change')
+    ChangeSequence = apps.get_model('changes', 'ChangeSequence')
+    # Уже выданные клиентам курсоры — это id, поэтому seq старых записей
+    # равен id.
+    Change.objects.update(seq=F('id'))
+    last = Change.objects.aggregate(last=Max('id'))['last'] or 0
+    ChangeSequence.objects.create(pk=1, last=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last', models.BigIntegerField(default=0, verbose_name='Последний выданный номер')),
+            ],
+            options={
+                'verbose_name': 'счетчик журнала',
+                'verbose_name_plural': 'Счетчик журнала',
+            },
+        ),
+        migrations.AddField(
+            model_name='change',
+            name='seq',
+            field=models.BigIntegerField(blank=True, null=True, unique=True, verbose_name='Порядковый номер'),
+        ),
+        migrations.RunPython(fill_seq, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(condition=models.Q(('seq__isnull', True)), fields=['id'], name='change_unpublished_idx'),
+        ),
+    ]
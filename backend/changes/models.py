@@ -0,0 +1,67 @@
+from django.db import models
+
+from recipes.constants import MAX_LENGTH_32
+from users.models import User
+
+
+class Change(models.Model):
+    class Action(models.TextChoices):
+        UPSERT = 'upsert', 'Создание или изменение'
+        DELETE = 'delete', 'Удаление'
+
+    id = models.BigAutoField('Номер', primary_key=True)
+    # id выдается при вставке, а видна запись после коммита, поэтому
+    # клиентам отдается seq: его выдает publish_changes уже закоммиченным
+    # записям, и порядок seq совпадает с порядком их появления.
+    seq = models.BigIntegerField('Порядковый номер', null=True, blank=True,
+                                 unique=True)
+    model = models.CharField('Модель', max_length=MAX_LENGTH_32)
+    object_id = models.BigIntegerField('Объект')
+    action = models.CharField('Действие', max_length=MAX_LENGTH_32,
+                              choices=Action.choices)
+    # Без ограничения внешнего ключа: изменения, записанные при каскадном
+    # удалении пользователя, не должны мешать удалению.
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True,
+                             blank=True, db_constraint=False,
+                             related_name='changes',
+                             verbose_name='Виден только пользователю')
+    created_at = models.DateTimeField('Создано', auto_now_add=True,
+                                      db_index=True)
+
+    class Meta:
+        ordering = ('id',)
+        indexes = (
+            models.Index(fields=('model', 'object_id'),
+                         name='change_object_idx'),
+            models.Index(fields=('id',), name='change_unpublished_idx',
+                         condition=models.Q(seq__isnull=True)),
+        )
+        verbose_name = 'изменение'
+        verbose_name_plural = 'Изменения'
+
+    def __str__(self):
+        return f'#{self.id} {self.model}:{self.object_id} {self.action}'
+
+
+class ChangeSequence(models.Model):
+    last = models.BigIntegerField('Последний выданный номер', default=0)
+
+    class Meta:
+        verbose_name = 'счетчик журнала'
+        verbose_name_plural = 'Счетчик журнала'
+
+    def __str__(self):
+        return f'#{self.last}'
+
+
+class Compaction(models.Model):
+    through = models.BigIntegerField('Удалены изменения до номера')
+    created_at = models.DateTimeField('Выполнено', auto_now_add=True)
+
+    class Meta:
+        ordering = ('-through',)
+        verbose_name = 'сжатие журнала'
+        verbose_name_plural = 'Сжатия журнала'
+
+    def __str__(self):
+        return f'#{self.through}'
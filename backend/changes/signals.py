@@ -0,0 +1,78 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from changes.models import Change
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.purge import recipes_deleted, rows_purging
+from recipes.signals import recipes_updated
+from users.models import Subscription
+
+# Запись в журнал идет в той же транзакции, что и само изменение.
+PUBLIC_MODELS = {Recipe: 'recipe', Tag: 'tag', Ingredient: 'ingredient'}
+PRIVATE_MODELS = {Favorite: ('favorite', 'recipe_id'),
+                  ShoppingCart: ('shopping_cart', 'recipe_id'),
+                  Subscription: ('subscription', 'author_id')}
+
+
+def record(model, object_id, action=Change.Action.UPSERT, user_id=None):
+    Change.objects.create(model=model, object_id=object_id, action=action,
+                          user_id=user_id)
+
+
+def public_saved(sender, instance, **kwargs):
+    record(PUBLIC_MODELS[sender], instance.pk)
+
+
+def public_deleted(sender, instance, **kwargs):
+    record(PUBLIC_MODELS[sender], instance.pk, Change.Action.DELETE)
+
+
+def private_saved(sender, instance, created, **kwargs):
+    model, field = PRIVATE_MODELS[sender]
+    record(model, getattr(instance, field), user_id=instance.user_id)
+
+
+def private_deleted(sender, instance, **kwargs):
+    model, field = PRIVATE_MODELS[sender]
+    record(model, getattr(instance, field), Change.Action.DELETE,
+           instance.user_id)
+
+
+for public_model in PUBLIC_MODELS:
+    post_save.connect(public_saved, sender=public_model)
+    post_delete.connect(public_deleted, sender=public_model)
+
+for private_model in PRIVATE_MODELS:
+    post_save.connect(private_saved, sender=private_model)
+    post_delete.connect(private_deleted, sender=private_model)
+
+
+@receiver(recipes_deleted, sender=Recipe)
+def recipes_hidden(sender, recipe_ids, **kwargs):
+    Change.objects.bulk_create(
+        Change(model='recipe', object_id=recipe_id,
+               action=Change.Action.DELETE)
+        for recipe_id in recipe_ids)
+
+
+def private_purging(sender, pks, **kwargs):
+    model, field = PRIVATE_MODELS[sender]
+    Change.objects.bulk_create(
+        Change(model=model, object_id=object_id,
+               action=Change.Action.DELETE, user_id=user_id)
+        for object_id, user_id in sender._base_manager.filter(
+            pk__in=pks).values_list(field, 'user_id'))
+
+
+for private_model in PRIVATE_MODELS:
+    rows_purging.connect(private_purging, sender=private_model)
+
+
+# Изменения тегов, ингредиентов и авторов рецептов обновляют рецепты
+# массовым UPDATE, в том числе при смене состава и тегов самого рецепта.
+@receiver(recipes_updated, sender=Recipe)
+def recipes_changed(sender, recipe_ids, **kwargs):
+    Change.objects.bulk_create(
+        Change(model='recipe', object_id=recipe_id,
+               action=Change.Action.UPSERT)
+        for recipe_id in recipe_ids)
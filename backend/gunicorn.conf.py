@@ -0,0 +1,47 @@
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    wsgi_app = 'backend.asgi:application'
+else:
+    wsgi_app = 'backend.wsgi:application'
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+# Приложение загружается и прогревается в мастере до fork, воркеры делят
+# его память (copy-on-write).
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+if preload_app and os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    # Метрики создаются при загрузке приложения, до on_starting.
+    os.makedirs(os.getenv('PROMETHEUS_MULTIPROC_DIR'), exist_ok=True)
+
+
+def on_starting(server):
+    metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    if preload_app:
+        from api.warmup import warm_up
+        warm_up()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        from api.warmup import warm_up
+        warm_up()
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    from recipes.counters import view_counter
+    view_counter.flush()
@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'queue', 'status', 'attempts', 'run_at',
+                    'finished_at')
+    list_filter = ('status', 'queue')
+    search_fields = ('name',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
@@ -0,0 +1,73 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobs.queue import claim_jobs, release_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Запуск обработчика фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queues',
+            nargs='+',
+            default=['default', 'images', 'purge'],
+            help='Обрабатываемые очереди'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=settings.JOBS_WORKER_THREADS,
+            help='Количество потоков'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.JOBS_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, сек.'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=settings.JOBS_STALE_AFTER,
+            help='Через сколько секунд зависшая задача возвращается '
+                 'в очередь'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить доступные задачи и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        threads = options['threads']
+        in_flight = set()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработчик запущен: очереди {", ".join(options["queues"])}, '
+            f'потоков {threads}.'))
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            while self.running:
+                in_flight = {future for future in in_flight
+                             if not future.done()}
+                release_stale_jobs(options['stale_after'])
+                job_ids = claim_jobs(options['queues'],
+                                     threads - len(in_flight))
+                close_old_connections()
+                in_flight.update(
+                    executor.submit(run_job, job_id) for job_id in job_ids)
+                if options['once'] and not job_ids and not in_flight:
+                    break
+                if not job_ids:
+                    time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS('Обработчик остановлен.'))
+
+    def stop(self, signum, frame):
+        self.running = False
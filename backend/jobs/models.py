@@ -0,0 +1,46 @@
+from django.db import models
+from django.utils.timezone import now
+
+from recipes.constants import MAX_LENGTH_32, MAX_LENGTH_128
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+class Job(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Выполнена'
+        FAILED = 'failed', 'Ошибка'
+
+    name = models.CharField('Задача', max_length=MAX_LENGTH_128)
+    queue = models.CharField('Очередь', max_length=MAX_LENGTH_32,
+                             default='default')
+    args = models.JSONField('Аргументы', default=list, blank=True)
+    kwargs = models.JSONField('Именованные аргументы', default=dict,
+                              blank=True)
+    status = models.CharField('Статус', max_length=MAX_LENGTH_32,
+                              choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField('Попытки', default=0)
+    max_attempts = models.PositiveIntegerField(
+        'Максимум попыток', default=DEFAULT_MAX_ATTEMPTS)
+    run_at = models.DateTimeField('Запустить не раньше', default=now)
+    started_at = models.DateTimeField('Начало выполнения', null=True,
+                                      blank=True)
+    finished_at = models.DateTimeField('Окончание выполнения', null=True,
+                                       blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('run_at',)
+        indexes = (
+            models.Index(fields=('queue', 'run_at'),
+                         condition=models.Q(status='pending'),
+                         name='job_pending_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
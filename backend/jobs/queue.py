@@ -0,0 +1,108 @@
+import logging
+import traceback
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F
+from django.utils.timezone import now
+
+from api.metrics import JOBS_PENDING, on_scrape
+from api.middleware import origin
+
+from .models import DEFAULT_MAX_ATTEMPTS, Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+# Задача, которую выполняет текущий поток воркера.
+current_job = ContextVar('current_job', default=None)
+
+
+def task(name, queue='default', max_attempts=DEFAULT_MAX_ATTEMPTS):
+    def decorator(func):
+        func.task_name = name
+        TASKS[name] = (func, queue, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, *args, delay=None, **kwargs):
+    func, queue, max_attempts = TASKS[name]
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: func(*args, **kwargs))
+        return None
+    return Job.objects.create(
+        name=name, queue=queue, args=list(args), kwargs=kwargs,
+        max_attempts=max_attempts,
+        run_at=now() + timedelta(seconds=delay or 0),
+    )
+
+
+def claim_jobs(queues, limit):
+    with transaction.atomic():
+        job_ids = list(Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.Status.PENDING, queue__in=queues, run_at__lte=now()
+        ).order_by('run_at').values_list('pk', flat=True)[:limit])
+        Job.objects.filter(pk__in=job_ids).update(
+            status=Job.Status.RUNNING, started_at=now(),
+            attempts=F('attempts') + 1)
+    return job_ids
+
+
+def release_stale_jobs(timeout):
+    return Job.objects.filter(
+        status=Job.Status.RUNNING,
+        started_at__lt=now() - timedelta(seconds=timeout),
+    ).update(status=Job.Status.PENDING)
+
+
+def heartbeat():
+    # Длинная задача продлевает аренду, чтобы release_stale_jobs не
+    # вернул ее в очередь и второй воркер не начал ту же работу.
+    job_id = current_job.get()
+    if job_id is not None:
+        Job.objects.filter(pk=job_id, status=Job.Status.RUNNING).update(
+            started_at=now())
+
+
+def run_job(job_id):
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_id)
+        token = current_job.set(job.pk)
+        try:
+            func = TASKS[job.name][0]
+            with origin(f'task:{job.name}'):
+                func(*job.args, **job.kwargs)
+        except Exception:
+            logger.exception('Задача %s (%s) завершилась ошибкой',
+                             job.pk, job.name)
+            fail_job(job, traceback.format_exc())
+        else:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.Status.DONE, finished_at=now(), last_error='')
+        finally:
+            current_job.reset(token)
+    finally:
+        close_old_connections()
+
+
+def fail_job(job, error):
+    if job.attempts >= job.max_attempts:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.Status.FAILED, finished_at=now(), last_error=error)
+        return
+    backoff = settings.JOBS_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.Status.PENDING, last_error=error,
+        run_at=now() + timedelta(seconds=backoff))
+
+
+@on_scrape
+def collect_queue_depth():
+    depth = dict(Job.objects.filter(status=Job.Status.PENDING).values_list(
+        'queue').annotate(total=Count('pk')).order_by())
+    for queue in {*depth, *(queue for _, queue, _ in TASKS.values())}:
+        JOBS_PENDING.labels(queue).set(depth.get(queue, 0))
@@ -2,8 +2,9 @@ from django.contrib import admin
 from django.contrib.auth.models import Group
 from django.utils.safestring import mark_safe
 
+from .admin_tools import AutocompleteFilter, ScalableModelAdmin, count_subquery
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+                     RecipeStats, ShoppingCart, Tag)
 
 admin.site.unregister(Group)
 
@@ -12,20 +13,26 @@ class IngredientsInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
-@admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class RecipeRelationAdmin(ScalableModelAdmin):
     list_display = ('id', 'user', 'recipe')
-    search_fields = ('user', 'recipe')
-    list_filter = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__username', 'user__email', 'recipe__name')
+    list_filter = (('user', AutocompleteFilter),
+                   ('recipe', AutocompleteFilter))
+    autocomplete_fields = ('user', 'recipe')
+
+
+@admin.register(Favorite)
+class FavoriteAdmin(RecipeRelationAdmin):
+    pass
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'recipe')
-    search_fields = ('user', 'recipe')
-    list_filter = ('user', 'recipe')
+class ShoppingCartAdmin(RecipeRelationAdmin):
+    pass
 
 
 @admin.register(Tag)
@@ -46,13 +53,21 @@ class IngredientAdmin(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ScalableModelAdmin):
     search_fields = ('name', )
     list_display = (
-        'id', 'author', 'name', 'get_image', 'text', 'favorite_count')
+        'id', 'author', 'name', 'get_image', 'text', 'favorite_count',
+        'views')
     list_display_links = ('id', 'name')
+    list_select_related = ('author', 'stats')
+    list_filter = (('author', AutocompleteFilter), 'tags')
+    autocomplete_fields = ('author',)
     inlines = (IngredientsInline,)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            favorites_count=count_subquery(Favorite.objects, 'recipe'))
+
     @admin.display(description='Изображение')
     def get_image(self, obj):
         if obj.image:
@@ -60,11 +75,19 @@ class RecipeAdmin(admin.ModelAdmin):
                 f'<img src={obj.image.url} width="80" height="60">')
         return '(none)'
 
-    @admin.display(description='Кол-во добавлений в Избранное')
+    @admin.display(description='Кол-во добавлений в Избранное',
+                   ordering='favorites_count')
     def favorite_count(self, obj):
-        count = obj.favorites.count()
+        count = obj.favorites_count
         return f'{count} {"раз" if count != 1 else "раза"}'
 
+    @admin.display(description='Просмотры', ordering='stats__views')
+    def views(self, obj):
+        try:
+            return obj.stats.views
+        except RecipeStats.DoesNotExist:
+            return 0
+
     @admin.display(description='Ингредиенты')
     def get_ingredients(self, obj):
         return ', '.join(
@@ -81,5 +104,10 @@ class RecipeAdmin(admin.ModelAdmin):
 
 
 @admin.register(RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
-    list_display = ('id', 'recipe', 'amount')
+class RecipeIngredientAdmin(ScalableModelAdmin):
+    list_display = ('id', 'recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
+    search_fields = ('recipe__name', 'ingredient__name')
+    list_filter = (('recipe', AutocompleteFilter),
+                   ('ingredient', AutocompleteFilter))
+    autocomplete_fields = ('recipe', 'ingredient')
@@ -0,0 +1,84 @@
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+
+# Ниже этого порога оценка pg_class неточна, и дешевле посчитать строки.
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def count_subquery(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if (connection.vendor == 'postgresql' and query is not None
+                and query.where == self.default_where()):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE relname = %s',
+                    [self.object_list.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+        return super().count
+
+    def default_where(self):
+        # Условие менеджера по умолчанию (скрытие мягко удаленных рецептов)
+        # не считается фильтром: таких строк немного, их удаляет фоновая
+        # очистка.
+        return self.object_list.model._default_manager.all().query.where
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin,
+                 field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin,
+                         field_path)
+        self.form_field = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site),
+            required=False,
+        )
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            'lookup': self.lookup_kwarg,
+            'selected': self.lookup_val is not None,
+            'clear_url': changelist.get_query_string(
+                remove=[self.lookup_kwarg]),
+            'widget': self.form_field.widget.render(
+                self.lookup_kwarg, self.lookup_val,
+                attrs={'id': f'filter_{self.lookup_kwarg}'}),
+        }
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(None, self.admin_site).media
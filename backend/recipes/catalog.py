@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from api.metrics import CACHE_REQUESTS
+from recipes.models import Tag
+
+TAG_CATALOG_KEY = 'recipes:tag_catalog'
+# Маска хранится в BigIntegerField, поэтому в нее помещаются биты 0..62.
+# Биты раздаются тегам плотно, а освободившиеся после удаления тега
+# переходят к тегам без бита.
+TAG_BITS = 63
+# До этого числа тегов фильтр перечисляет все подходящие маски и
+# использует индекс по tags_mask, дальше переходит на побитовое AND.
+MAX_ENUMERATED_TAGS = 10
+
+
+def assign_tag_bits():
+    used = set(Tag.objects.exclude(bit=None).values_list('bit', flat=True))
+    free = (bit for bit in range(TAG_BITS) if bit not in used)
+    assigned = []
+    for tag_id in Tag.objects.filter(bit=None).order_by('id').values_list(
+            'id', flat=True):
+        for bit in free:
+            # Параллельная транзакция могла занять тот же бит: уникальность
+            # bit отклонит UPDATE, и тег получит следующий свободный.
+            try:
+                with transaction.atomic():
+                    updated = Tag.objects.filter(pk=tag_id, bit=None).update(
+                        bit=bit)
+            except IntegrityError:
+                continue
+            if updated:
+                assigned.append(tag_id)
+            break
+        else:
+            break
+    return assigned
+
+
+def get_tag_catalog():
+    # Слаг -> маска тега; 0 у тегов без бита.
+    catalog = cache.get(TAG_CATALOG_KEY)
+    if catalog is not None:
+        CACHE_REQUESTS.labels('tag_catalog', 'hit').inc()
+        return catalog
+    CACHE_REQUESTS.labels('tag_catalog', 'miss').inc()
+    catalog = {
+        slug: 0 if bit is None else 1 << bit
+        for slug, bit in Tag.objects.values_list('slug', 'bit')
+    }
+    cache.set(TAG_CATALOG_KEY, catalog, None)
+    return catalog
+
+
+def invalidate_tag_catalog():
+    cache.delete(TAG_CATALOG_KEY)
+
+
+def masks_intersecting(mask, catalog):
+    universe = 0
+    for bit in catalog.values():
+        universe |= bit
+    submask = universe
+    while True:
+        if submask & mask:
+            yield submask
+        if not submask:
+            return
+        submask = (submask - 1) & universe
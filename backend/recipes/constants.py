@@ -5,3 +5,28 @@ MAX_LENGTH_64 = 64
 MAX_LENGTH_32 = 32
 MAX_LENGTH_20 = 20
 MIN_VALUE_1 = 1
+MAX_IMAGE_SIDE = 1600
+SIMILAR_RECIPES_LIMIT = 10
+SIMILAR_RECIPES_CANDIDATES = 200
+SIMILAR_MAX_DF = 0.1
+PANTRY_MAX_INGREDIENTS = 100
+PANTRY_RESULTS_LIMIT = 20
+PANTRY_MAX_RESULTS_LIMIT = 100
+PANTRY_INDEX_TTL = 300
+TRENDING_WEIGHT_FAVORITE = 3
+TRENDING_WEIGHT_SHOPPING_CART = 2
+TRENDING_WEIGHT_VIEW = 1
+TRENDING_LIMIT = 20
+TRENDING_MAX_LIMIT = 100
+# Сдвиг точки отсчета, когда множитель достигает e**TRENDING_REBASE_AFTER.
+TRENDING_REBASE_AFTER = 300
+BATCH_MAX_ITEMS = 10
+BATCH_MAX_THREADS = 4
+BATCH_URL_PREFIX = '/api/'
+MAX_PAGE_SIZE = 100
+EXPORT_CHUNK_SIZE = 500
+CHANGES_LIMIT = 100
+CHANGES_MAX_LIMIT = 1000
+PURGE_BATCH_SIZE = 500
+SHARE_DESCRIPTION_LENGTH = 200
+FACET_AUTHORS_LIMIT = 50
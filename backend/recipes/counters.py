@@ -0,0 +1,89 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection
+
+from recipes.constants import TRENDING_WEIGHT_VIEW
+from recipes.models import Recipe, RecipeStats
+from recipes.trending import scaled
+
+logger = logging.getLogger(__name__)
+
+# Просмотры копятся в памяти процесса и раз в VIEW_COUNTER_FLUSH_INTERVAL
+# секунд записываются одним запросом. При штатной остановке воркера
+# (atexit, worker_exit в gunicorn) буфер сбрасывается; при аварийном
+# завершении (SIGKILL, OOM) теряются просмотры не более чем за один
+# интервал. Если запись в БД не удалась, дельты возвращаются в буфер.
+
+FLUSH_SQL = '''
+    WITH delta (recipe_id, views) AS (VALUES {values})
+    INSERT INTO {stats} (recipe_id, views, trending_score)
+    SELECT delta.recipe_id, delta.views, delta.views * %s
+    FROM delta JOIN {recipe} ON {recipe}.id = delta.recipe_id
+    WHERE TRUE
+    ON CONFLICT (recipe_id) DO UPDATE SET
+        views = {stats}.views + EXCLUDED.views,
+        trending_score = {stats}.trending_score + EXCLUDED.trending_score
+'''
+
+
+def write_views(counts):
+    quote = connection.ops.quote_name
+    sql = FLUSH_SQL.format(
+        values=', '.join(['(%s, %s)'] * len(counts)),
+        stats=quote(RecipeStats._meta.db_table),
+        recipe=quote(Recipe._meta.db_table))
+    params = [value for item in counts.items() for value in item]
+    params.append(scaled(TRENDING_WEIGHT_VIEW))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+class ViewCounter:
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.pid = None
+
+    def record(self, recipe_id, count=1):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.start()
+            self.pending[recipe_id] += count
+
+    def start(self):
+        # После fork буфер и поток родителя не наследуются.
+        self.pid = os.getpid()
+        self.pending = Counter()
+        threading.Thread(target=self.run, name='view-counter',
+                         daemon=True).start()
+        atexit.register(self.flush)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            close_old_connections()
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+        if not pending:
+            return 0
+        try:
+            write_views(pending)
+        except DatabaseError:
+            logger.exception('Не удалось записать просмотры рецептов')
+            with self.lock:
+                self.pending.update(pending)
+            return 0
+        return sum(pending.values())
+
+
+view_counter = ViewCounter(settings.VIEW_COUNTER_FLUSH_INTERVAL)
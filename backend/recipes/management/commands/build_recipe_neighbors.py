@@ -0,0 +1,141 @@
+from array import array
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from scipy import sparse
+
+from recipes.constants import SIMILAR_MAX_DF, SIMILAR_RECIPES_LIMIT
+from recipes.models import RecipeIngredient, RecipeNeighbor
+from recipes.similarity import (COSINE, JACCARD, document_frequency_limit,
+                                remember_frequent_ingredients)
+
+# Ячейка разреженного результата: float64 + int32 индекс столбца.
+BYTES_PER_NONZERO = 12
+FETCH_CHUNK_SIZE = 50000
+# Пары заменяются короткими транзакциями по столько рецептов.
+WRITE_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Пересчет похожих рецептов по пересечению ингредиентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--k',
+            type=int,
+            default=SIMILAR_RECIPES_LIMIT,
+            help='Количество соседей для каждого рецепта'
+        )
+        parser.add_argument(
+            '--metric',
+            choices=(COSINE, JACCARD),
+            default=COSINE,
+            help='Мера сходства'
+        )
+        parser.add_argument(
+            '--memory-mb',
+            type=int,
+            default=512,
+            help='Бюджет памяти на один пакет произведения матриц, МБ'
+        )
+        parser.add_argument(
+            '--max-df',
+            type=float,
+            default=SIMILAR_MAX_DF,
+            help='Игнорировать ингредиенты, которые встречаются в большей '
+                 'доле рецептов (соль, вода и т.п.)'
+        )
+
+    def handle(self, *args, **options):
+        recipe_ids, matrix = self.load_matrix(options['max_df'])
+        if not len(recipe_ids):
+            self.stdout.write(self.style.NOTICE('Нет рецептов.'))
+            return
+        sizes = np.asarray(matrix.sum(axis=1)).ravel()
+        budget = options['memory_mb'] * 1024 * 1024 // BYTES_PER_NONZERO
+        total = 0
+        for start, stop in self.batches(matrix, budget):
+            neighbors = self.top_k(matrix, sizes, start, stop,
+                                   options['k'], options['metric'])
+            for chunk in range(start, stop, WRITE_BATCH_SIZE):
+                chunk_stop = min(chunk + WRITE_BATCH_SIZE, stop)
+                with transaction.atomic():
+                    RecipeNeighbor.objects.filter(recipe_id__in=[
+                        int(recipe_id)
+                        for recipe_id in recipe_ids[chunk:chunk_stop]
+                    ]).delete()
+                    RecipeNeighbor.objects.bulk_create(
+                        RecipeNeighbor(recipe_id=int(recipe_ids[row]),
+                                       neighbor_id=int(recipe_ids[column]),
+                                       score=float(score))
+                        for row, column, score in neighbors
+                        if chunk <= row < chunk_stop
+                    )
+            total += len(neighbors)
+        # Пары удаленных рецептов и рецептов без ингредиентов.
+        RecipeNeighbor.objects.filter(
+            Q(recipe__is_deleted=True) | Q(neighbor__is_deleted=True)
+            | ~Exists(RecipeIngredient.objects.filter(
+                recipe_id=OuterRef('recipe_id')))
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Сохранено {total} пар похожих рецептов '
+            f'для {len(recipe_ids)} рецептов.'))
+
+    def load_matrix(self, max_df):
+        rows, columns = array('q'), array('q')
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe__is_deleted=False).order_by().values_list(
+                'recipe_id', 'ingredient_id').iterator(
+                chunk_size=FETCH_CHUNK_SIZE):
+            rows.append(recipe_id)
+            columns.append(ingredient_id)
+        recipe_ids, rows = np.unique(np.frombuffer(rows, dtype=np.int64),
+                                     return_inverse=True)
+        ingredient_ids, columns = np.unique(
+            np.frombuffer(columns, dtype=np.int64), return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, columns)),
+            shape=(len(recipe_ids), columns.max(initial=-1) + 1))
+        document_frequency = np.asarray(matrix.sum(axis=0)).ravel()
+        keep = document_frequency <= document_frequency_limit(
+            max_df, len(recipe_ids))
+        remember_frequent_ingredients(
+            ingredient_ids[~keep].tolist(), max_df)
+        return recipe_ids, matrix[:, np.flatnonzero(keep)].tocsr()
+
+    @staticmethod
+    def batches(matrix, budget):
+        # Оценка сверху числа ненулевых элементов строки X @ X.T.
+        column_counts = np.asarray(matrix.sum(axis=0)).ravel()
+        row_costs = matrix @ column_counts
+        start, cost = 0, 0
+        for row, row_cost in enumerate(row_costs):
+            if cost and cost + row_cost > budget:
+                yield start, row
+                start, cost = row, 0
+            cost += row_cost
+        yield start, matrix.shape[0]
+
+    @staticmethod
+    def top_k(matrix, sizes, start, stop, k, metric):
+        overlap = (matrix[start:stop] @ matrix.T).tocsr()
+        result = []
+        for offset in range(stop - start):
+            row = start + offset
+            begin, end = overlap.indptr[offset], overlap.indptr[offset + 1]
+            columns = overlap.indices[begin:end]
+            values = overlap.data[begin:end]
+            mask = columns != row
+            columns, values = columns[mask], values[mask]
+            if not len(columns):
+                continue
+            if metric == JACCARD:
+                scores = values / (sizes[row] + sizes[columns] - values)
+            else:
+                scores = values / np.sqrt(sizes[row] * sizes[columns])
+            best = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            result.extend((row, columns[i], scores[i]) for i in best)
+        return result
@@ -0,0 +1,109 @@
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from recipes.counters import ViewCounter
+from recipes.models import Recipe, RecipeStats
+
+
+def stored_views(recipe_id):
+    return RecipeStats.objects.filter(recipe_id=recipe_id).values_list(
+        'views', flat=True).first() or 0
+
+
+class Command(BaseCommand):
+    help = ('Проверка счетчика просмотров: при аварийном завершении '
+            'процесса теряются просмотры не более чем за один интервал '
+            'сброса, при штатном — ни одного')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0.5,
+            help='Интервал сброса счетчика, секунд'
+        )
+        parser.add_argument(
+            '--rate',
+            type=int,
+            default=200,
+            help='Просмотров в секунду'
+        )
+        parser.add_argument(
+            '--intervals',
+            type=float,
+            default=3.5,
+            help='Сколько интервалов проработает процесс до завершения'
+        )
+
+    def expect(self, condition, message):
+        if not condition:
+            raise CommandError(message)
+        self.stdout.write(f'OK: {message}')
+
+    def run_worker(self, recipe_id, interval, rate, graceful):
+        # Дочерний процесс считает просмотры, как воркер gunicorn, и пишет
+        # в канал байт на каждый просмотр до того, как его учесть.
+        read_end, write_end = os.pipe()
+        connections.close_all()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            counter = ViewCounter(interval)
+            deadline = time.monotonic() + self.duration
+            while time.monotonic() < deadline:
+                os.write(write_end, b'.')
+                counter.record(recipe_id)
+                time.sleep(1 / rate)
+            if graceful:
+                counter.flush()
+            else:
+                time.sleep(self.duration)
+            os._exit(0)
+        os.close(write_end)
+        if graceful:
+            os.waitpid(pid, 0)
+        else:
+            time.sleep(self.duration)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        recorded = 0
+        while True:
+            chunk = os.read(read_end, 65536)
+            if not chunk:
+                break
+            recorded += len(chunk)
+        os.close(read_end)
+        return recorded
+
+    def handle(self, *args, **options):
+        recipe = Recipe.objects.order_by('pk').first()
+        if recipe is None:
+            raise CommandError('Нет рецептов для проверки.')
+        interval, rate = options['interval'], options['rate']
+        self.duration = interval * options['intervals']
+        bound = rate * interval * 1.5
+
+        before = stored_views(recipe.pk)
+        recorded = self.run_worker(recipe.pk, interval, rate, graceful=False)
+        after = stored_views(recipe.pk)
+        lost = before + recorded - after
+        self.stdout.write(
+            f'Аварийное завершение: учтено {recorded}, записано '
+            f'{after - before}, потеряно {lost}')
+        self.expect(after > before, 'Просмотры записываются до сбоя')
+        self.expect(0 <= lost <= bound,
+                    f'Потеряно не больше чем за интервал '
+                    f'({lost} <= {bound:.0f})')
+
+        before = after
+        recorded = self.run_worker(recipe.pk, interval, rate, graceful=True)
+        after = stored_views(recipe.pk)
+        self.expect(after - before == recorded,
+                    f'При штатной остановке записаны все {recorded} '
+                    f'просмотров')
+        self.stdout.write(self.style.SUCCESS(
+            'Потери счетчика просмотров ограничены интервалом сброса.'))
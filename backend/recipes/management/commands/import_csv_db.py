@@ -2,6 +2,8 @@ import csv
 
 from django.core.management.base import BaseCommand
 
+from api.cache import ingredient_cache
+from api.metrics import IMPORT_DURATION, IMPORT_ROWS
 from recipes.models import Ingredient
 
 
@@ -16,6 +18,7 @@ class Command(BaseCommand):
             help='Путь к CSV файлу'
         )
 
+    @IMPORT_DURATION.labels('import_csv_db').time()
     def handle(self, *args, **kwargs):
         csv_file = kwargs['csv_file']
         ingredients_to_create = []
@@ -34,6 +37,7 @@ class Command(BaseCommand):
                         name=name, measurement_unit=measurement_unit)
                     )
                 else:
+                    IMPORT_ROWS.labels('import_csv_db', 'skipped').inc()
                     self.stdout.write(
                         self.style.WARNING(
                             f'Ингредиент "{name}" уже существует.'
@@ -44,6 +48,9 @@ class Command(BaseCommand):
             Ingredient.objects.bulk_create(
                 ingredients_to_create, ignore_conflicts=True
             )
+            ingredient_cache.invalidate()
+            IMPORT_ROWS.labels('import_csv_db', 'created').inc(
+                len(ingredients_to_create))
             for ingredient in ingredients_to_create:
                 self.stdout.write(
                     self.style.SUCCESS(
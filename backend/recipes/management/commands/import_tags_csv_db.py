@@ -2,6 +2,9 @@ import csv
 
 from django.core.management.base import BaseCommand
 
+from api.cache import tag_cache
+from api.metrics import IMPORT_DURATION, IMPORT_ROWS
+from recipes.catalog import assign_tag_bits, invalidate_tag_catalog
 from recipes.models import Tag
 
 
@@ -16,6 +19,7 @@ class Command(BaseCommand):
             help='Путь к CSV файлу'
         )
 
+    @IMPORT_DURATION.labels('import_tags_csv_db').time()
     def handle(self, *args, **kwargs):
         csv_file = kwargs['csv_file']
         tags_to_create = []
@@ -30,12 +34,18 @@ class Command(BaseCommand):
                 if slug not in existing_tags:
                     tags_to_create.append(Tag(name=name, slug=slug))
                 else:
+                    IMPORT_ROWS.labels('import_tags_csv_db', 'skipped').inc()
                     self.stdout.write(self.style.WARNING(
                         f'Тег с slug "{slug}" уже существует.')
                     )
 
         if tags_to_create:
             Tag.objects.bulk_create(tags_to_create, ignore_conflicts=True)
+            assign_tag_bits()
+            invalidate_tag_catalog()
+            tag_cache.invalidate()
+            IMPORT_ROWS.labels('import_tags_csv_db', 'created').inc(
+                len(tags_to_create))
             for tag in tags_to_create:
                 self.stdout.write(self.style.SUCCESS(
                     f'Тег "{tag.name}" успешно добавлен.')
@@ -0,0 +1,28 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from recipes.share import build_share_page, page_path, share_links
+
+
+class Command(BaseCommand):
+    help = 'Рендеринг страниц /s/<code>/ для всех коротких ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перерендерить и уже существующие страницы'
+        )
+
+    def handle(self, *args, **options):
+        rendered = skipped = 0
+        for link in share_links().iterator():
+            if not options['force'] and os.path.exists(
+                    page_path(link.short_code)):
+                skipped += 1
+                continue
+            build_share_page(link)
+            rendered += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Отрендерено страниц: {rendered}, пропущено: {skipped}.'))
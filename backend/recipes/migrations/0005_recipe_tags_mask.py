@@ -0,0 +1,34 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:08
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+MAX_TAG_BIT = 62
+
+
+def fill_tags_mask(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    masks = defaultdict(int)
+    for recipe_id, tag_id in Recipe.tags.through.objects.values_list(
+            'recipe_id', 'tag_id'):
+        if tag_id <= MAX_TAG_BIT:
+            masks[recipe_id] |= 1 << tag_id
+    for recipe_id, mask in masks.items():
+        Recipe.objects.filter(pk=recipe_id).update(tags_mask=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_auto_20261019_1308'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='Битовая маска тегов'),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbor_of', to='recipes.recipe', verbose_name='Похожий рецепт')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'похожий рецепт',
+                'verbose_name_plural': 'Похожие рецепты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipeneighbor',
+            index=models.Index(fields=['recipe', '-score'], name='recipe_neighbor_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeneighbor',
+            constraint=models.UniqueConstraint(fields=('recipe', 'neighbor'), name='unique_recipe_neighbor'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:20
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+FAVORITE_WEIGHT = 3
+SHOPPING_CART_WEIGHT = 2
+
+
+def fill_recipe_stats(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeStats = apps.get_model('recipes', 'RecipeStats')
+    TrendingReference = apps.get_model('recipes', 'TrendingReference')
+    TrendingReference.objects.create()
+    scores = defaultdict(float)
+    for model, weight in (('Favorite', FAVORITE_WEIGHT),
+                          ('ShoppingCart', SHOPPING_CART_WEIGHT)):
+        for recipe_id in apps.get_model('recipes', model).objects.values_list(
+                'recipe_id', flat=True):
+            scores[recipe_id] += weight
+    RecipeStats.objects.bulk_create(
+        (RecipeStats(recipe_id=recipe_id, trending_score=scores[recipe_id])
+         for recipe_id in Recipe.objects.values_list('pk', flat=True)),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipeneighbor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('trending_score', models.FloatField(default=0, verbose_name='Популярность')),
+            ],
+            options={
+                'verbose_name': 'статистика рецепта',
+                'verbose_name_plural': 'Статистика рецептов',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Точка отсчета затухания')),
+            ],
+            options={
+                'verbose_name': 'точка отсчета популярности',
+                'verbose_name_plural': 'Точка отсчета популярности',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipestats',
+            index=models.Index(condition=models.Q(('trending_score__gt', 0)), fields=['-trending_score'], name='recipe_stats_trending_idx'),
+        ),
+        migrations.RunPython(fill_recipe_stats, migrations.RunPython.noop),
+    ]
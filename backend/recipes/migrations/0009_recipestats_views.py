@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipestats',
+            name='views',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Просмотры'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipestats_views'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_pub_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_author_pub_date_idx',
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='is_deleted',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Удален'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['pub_date'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['author', 'pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:51
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+RECIPE_URL = re.compile(r'/recipes/(\d+)/?$')
+
+
+def fill_short_link_recipes(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ShortLink = apps.get_model('recipes', 'ShortLink')
+    recipe_ids = set(Recipe.objects.values_list('pk', flat=True))
+    for link in ShortLink.objects.filter(recipe__isnull=True).exclude(
+            original_url=None).iterator():
+        match = RECIPE_URL.search(link.original_url)
+        if match and int(match[1]) in recipe_ids:
+            ShortLink.objects.filter(pk=link.pk).update(
+                recipe_id=int(match[1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_is_deleted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shortlink',
+            name='recipe',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='short_links', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.RunPython(fill_short_link_recipes,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:06
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+TAG_BITS = 63
+
+
+def fill_tag_bits(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Tag = apps.get_model('recipes', 'Tag')
+    tag_ids = Tag.objects.order_by('id').values_list('id', flat=True)
+    for bit, tag_id in enumerate(tag_ids[:TAG_BITS]):
+        Tag.objects.filter(pk=tag_id).update(bit=bit)
+    masks = defaultdict(int)
+    for recipe_id, bit in Recipe.tags.through.objects.filter(
+            tag__bit__isnull=False).values_list('recipe_id', 'tag__bit'):
+        masks[recipe_id] |= 1 << bit
+    Recipe.objects.exclude(pk__in=list(masks)).update(tags_mask=0)
+    for recipe_id, mask in masks.items():
+        Recipe.objects.filter(pk=recipe_id).update(tags_mask=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_shortlink_recipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, unique=True, verbose_name='Бит в маске тегов'),
+        ),
+        migrations.RunPython(fill_tag_bits, migrations.RunPython.noop),
+    ]
@@ -13,6 +13,11 @@ from users.models import User
 class Tag(models.Model):
     name = models.CharField('Название', max_length=MAX_LENGTH_32, unique=True)
     slug = models.SlugField('Слаг', max_length=MAX_LENGTH_32, unique=True)
+    # Плотный номер бита в Recipe.tags_mask; у тегов сверх емкости маски
+    # его нет, по ним фильтр идет через связь рецепт-тег.
+    bit = models.PositiveSmallIntegerField(
+        'Бит в маске тегов', null=True, blank=True, unique=True,
+        editable=False)
 
     class Meta:
         verbose_name = 'тег'
@@ -42,6 +47,16 @@ class Ingredient(models.Model):
         return self.name[:MAX_LENGTH_20]
 
 
+class RecipeQuerySet(models.QuerySet):
+    def visible(self):
+        return self.filter(is_deleted=False)
+
+
+class RecipeManager(models.Manager.from_queryset(RecipeQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().visible()
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='recipes', verbose_name='Автор')
@@ -52,6 +67,8 @@ class Recipe(models.Model):
                                         through='RecipeIngredient',
                                         verbose_name='Ингредиенты')
     tags = models.ManyToManyField(Tag, verbose_name='Теги')
+    tags_mask = models.BigIntegerField('Битовая маска тегов', default=0,
+                                       db_index=True, editable=False)
     cooking_time = models.PositiveIntegerField(
         'Время приготовления', validators=(
             MinValueValidator(
@@ -60,14 +77,38 @@ class Recipe(models.Model):
             ),
         ))
     pub_date = models.DateTimeField('Дата и время публикации', default=now,)
+    version = models.PositiveIntegerField('Версия', default=1,
+                                          editable=False)
+    is_deleted = models.BooleanField('Удален', default=False,
+                                     editable=False)
+
+    objects = RecipeManager()
+    all_objects = models.Manager.from_queryset(RecipeQuerySet)()
 
     def get_absolute_url(self):
         return reverse('recipe-detail', kwargs={'pk': self.pk})
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        self.version = models.F('version') + 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'version'}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=('version',))
+
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('pub_date',)
+        indexes = (
+            models.Index(fields=('pub_date',), name='recipe_pub_date_idx',
+                         condition=models.Q(is_deleted=False)),
+            models.Index(fields=('author', 'pub_date'),
+                         name='recipe_author_pub_date_idx',
+                         condition=models.Q(is_deleted=False)),
+        )
 
     def __str__(self):
         return self.name[:MAX_LENGTH_20]
@@ -141,7 +182,69 @@ class ShoppingCart(AbstractRecipeRelation):
         default_related_name = 'shoppingcarts'
 
 
+class RecipeStats(models.Model):
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE,
+                                  primary_key=True, related_name='stats',
+                                  verbose_name='Рецепт')
+    trending_score = models.FloatField('Популярность', default=0)
+    views = models.PositiveBigIntegerField('Просмотры', default=0)
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('-trending_score',),
+                         condition=models.Q(trending_score__gt=0),
+                         name='recipe_stats_trending_idx'),
+        )
+        verbose_name = 'статистика рецепта'
+        verbose_name_plural = 'Статистика рецептов'
+
+    def __str__(self):
+        return f'{self.recipe}: {self.trending_score:.2f}'
+
+
+class TrendingReference(models.Model):
+    reference = models.DateTimeField('Точка отсчета затухания',
+                                     default=now)
+
+    class Meta:
+        verbose_name = 'точка отсчета популярности'
+        verbose_name_plural = 'Точка отсчета популярности'
+
+    def __str__(self):
+        return f'{self.reference:%Y-%m-%d %H:%M}'
+
+
+class RecipeNeighbor(models.Model):
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='neighbors',
+                               verbose_name='Рецепт')
+    neighbor = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                                 related_name='neighbor_of',
+                                 verbose_name='Похожий рецепт')
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'neighbor'),
+                name='unique_recipe_neighbor'
+            ),
+        )
+        indexes = (
+            models.Index(fields=('recipe', '-score'),
+                         name='recipe_neighbor_score_idx'),
+        )
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.neighbor} ({self.score:.2f})'
+
+
 class ShortLink(models.Model):
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, null=True,
+                               blank=True, related_name='short_links',
+                               verbose_name='Рецепт')
     original_url = models.URLField(max_length=MAX_LENGTH_256, unique=True,
                                    null=True, verbose_name='Оригинальный URL')
     short_code = models.CharField(max_length=MAX_LENGTH_20, unique=True,
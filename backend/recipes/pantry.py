@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from array import array
+
+import numpy as np
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from recipes.constants import PANTRY_INDEX_TTL
+from recipes.models import RecipeIngredient
+
+logger = logging.getLogger(__name__)
+
+PANTRY_GENERATION_KEY = 'recipes:pantry_generation'
+
+
+class IngredientIndex:
+    def __init__(self, postings, recipe_ids, required):
+        # postings: ингредиент -> отсортированный массив id рецептов;
+        # recipe_ids отсортированы, required[i] — число ингредиентов
+        # рецепта recipe_ids[i].
+        self.postings = postings
+        self.recipe_ids = recipe_ids
+        self.required = required
+
+    @classmethod
+    def build(cls):
+        ingredients, recipes = array('q'), array('q')
+        for ingredient_id, recipe_id in RecipeIngredient.objects.filter(
+                recipe__is_deleted=False).order_by(
+                'ingredient_id', 'recipe_id').values_list(
+                'ingredient_id', 'recipe_id').iterator():
+            ingredients.append(ingredient_id)
+            recipes.append(recipe_id)
+        ingredients = np.frombuffer(ingredients, dtype=np.int64)
+        recipes = np.frombuffer(recipes, dtype=np.int64)
+        keys, starts = np.unique(ingredients, return_index=True)
+        postings = dict(zip(keys.tolist(), np.split(recipes, starts[1:])))
+        recipe_ids, required = np.unique(recipes, return_counts=True)
+        return cls(postings, recipe_ids, required)
+
+    def rank(self, ingredient_ids, limit):
+        lists = [self.postings[ingredient_id]
+                 for ingredient_id in set(ingredient_ids)
+                 if ingredient_id in self.postings]
+        if not lists:
+            return []
+        # Слияние отсортированных списков: рецепт и сколько из выбранных
+        # ингредиентов он содержит.
+        candidates, covered = np.unique(np.concatenate(lists),
+                                        return_counts=True)
+        missing = self.required[
+            np.searchsorted(self.recipe_ids, candidates)] - covered
+        best = np.lexsort((candidates, -covered, missing))[:limit]
+        return [(int(recipe_id), int(count), int(lack))
+                for recipe_id, count, lack in zip(
+                    candidates[best], covered[best], missing[best])]
+
+
+class IndexHolder:
+    # Первый раз индекс строится в запросе. Дальше при смене поколения или
+    # по TTL запросы получают текущий индекс, а новый строится в одном
+    # фоновом потоке и подменяет старый.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.generation = None
+        self.built_at = 0
+        self.building = False
+
+    def get(self):
+        generation = cache.get(PANTRY_GENERATION_KEY, 0)
+        with self.lock:
+            if self.index is None:
+                self.index = IngredientIndex.build()
+                self.generation = generation
+                self.built_at = time.monotonic()
+            elif not self.building and (
+                    generation != self.generation
+                    or time.monotonic() - self.built_at > PANTRY_INDEX_TTL):
+                self.building = True
+                threading.Thread(target=self.rebuild, args=(generation,),
+                                 name='pantry-index', daemon=True).start()
+            return self.index
+
+    def rebuild(self, generation):
+        index = None
+        try:
+            index = IngredientIndex.build()
+        except Exception:
+            logger.exception('Не удалось перестроить индекс ингредиентов')
+        finally:
+            connections.close_all()
+            with self.lock:
+                if index is not None:
+                    self.index = index
+                    self.generation = generation
+                    self.built_at = time.monotonic()
+                self.building = False
+
+
+index_holder = IndexHolder()
+
+
+def rank_recipes(ingredient_ids, limit):
+    return index_holder.get().rank(ingredient_ids, limit)
+
+
+def invalidate_pantry_index():
+    transaction.on_commit(
+        lambda: cache.set(PANTRY_GENERATION_KEY, time.time_ns(), None))
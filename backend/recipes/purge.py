@@ -0,0 +1,126 @@
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import F
+from django.dispatch import Signal
+from rest_framework.authtoken.models import Token
+
+from api.downloads import delete_protected, shopping_list_name
+from jobs.queue import enqueue, heartbeat
+from recipes.constants import PURGE_BATCH_SIZE
+from recipes.models import Recipe
+from users.models import User
+
+# Отправляется после скрытия рецептов, аргумент recipe_ids.
+recipes_deleted = Signal()
+# Отправляется в транзакции пакетного удаления перед самим DELETE,
+# аргумент pks.
+rows_purging = Signal()
+
+# Удаление в два этапа: запрос только скрывает строки (is_deleted у
+# рецепта, is_active у пользователя), а фоновая задача удаляет зависимые
+# строки пакетами по PURGE_BATCH_SIZE короткими запросами без сборщика
+# Django и только потом сами объекты и их файлы. Задачи берут не больше
+# PURGE_BATCH_SIZE рецептов и продлевают аренду после каждого пакета;
+# повторный запуск безопасен — удаленных строк он уже не найдет.
+
+
+def dependents(model, exclude=()):
+    for field in model._meta.get_fields(include_hidden=True):
+        if (field.auto_created and not field.concrete
+                and (field.one_to_many or field.one_to_one)
+                and field.related_model not in exclude):
+            yield field.related_model, field.field.column
+
+
+def delete_in_batches(model, column, values):
+    quote = connection.ops.quote_name
+    table, pk = quote(model._meta.db_table), quote(model._meta.pk.column)
+    placeholders = ', '.join(['%s'] * len(values))
+    sql = (f'SELECT {pk} FROM {table} WHERE {quote(column)} '
+           f'IN ({placeholders}) LIMIT %s')
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [*values, PURGE_BATCH_SIZE])
+                pks = [row[0] for row in cursor.fetchall()]
+            if pks:
+                rows_purging.send(sender=model, pks=pks)
+                delete_rows(model, pks)
+        heartbeat()
+        deleted += len(pks)
+        if len(pks) < PURGE_BATCH_SIZE:
+            return deleted
+
+
+def delete_rows(model, pks):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(model._meta.pk.column)} '
+            f'IN ({", ".join(["%s"] * len(pks))})', pks)
+
+
+def delete_files(names):
+    for name in names:
+        if name:
+            default_storage.delete(name)
+
+
+def hide_recipes(recipes):
+    recipe_ids = list(recipes.values_list('pk', flat=True))
+    if recipe_ids:
+        Recipe.all_objects.filter(pk__in=recipe_ids).update(
+            is_deleted=True, version=F('version') + 1)
+        recipes_deleted.send(sender=Recipe, recipe_ids=recipe_ids)
+    return recipe_ids
+
+
+def soft_delete_recipes(recipes):
+    recipe_ids = hide_recipes(recipes)
+    for start in range(0, len(recipe_ids), PURGE_BATCH_SIZE):
+        enqueue('recipes.purge_recipes',
+                recipe_ids[start:start + PURGE_BATCH_SIZE])
+
+
+@transaction.atomic
+def soft_delete_user(user):
+    user.is_active = False
+    user.save(update_fields=('is_active',))
+    Token.objects.filter(user=user).delete()
+    # Рецепты удалит purge_user, отдельные задачи на них не нужны.
+    hide_recipes(Recipe.objects.filter(author=user))
+    enqueue('recipes.purge_user', user.pk)
+
+
+def purge_recipes(recipe_ids):
+    recipe_ids = list(Recipe.all_objects.filter(
+        pk__in=recipe_ids, is_deleted=True).values_list('pk', flat=True))
+    if not recipe_ids:
+        return
+    images = list(Recipe.all_objects.filter(
+        pk__in=recipe_ids).values_list('image', flat=True))
+    for model, column in dependents(Recipe):
+        delete_in_batches(model, column, recipe_ids)
+    delete_in_batches(Recipe, Recipe._meta.pk.column, recipe_ids)
+    delete_files(images)
+
+
+def purge_user(user_id):
+    user = User.objects.filter(pk=user_id, is_active=False).first()
+    if user is None:
+        return
+    while True:
+        recipe_ids = list(Recipe.all_objects.filter(
+            author_id=user_id).values_list('pk', flat=True)[
+                :PURGE_BATCH_SIZE])
+        if not recipe_ids:
+            break
+        Recipe.all_objects.filter(pk__in=recipe_ids).update(is_deleted=True)
+        purge_recipes(recipe_ids)
+    for model, column in dependents(User, exclude=(Recipe,)):
+        delete_in_batches(model, column, [user_id])
+    delete_rows(User, [user_id])
+    delete_files([user.avatar.name])
+    delete_protected(shopping_list_name(user_id))
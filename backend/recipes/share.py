@@ -0,0 +1,68 @@
+import os
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+from django.utils.text import Truncator
+
+from api.downloads import remove_file, write_atomic
+from recipes.constants import SHARE_DESCRIPTION_LENGTH
+from recipes.models import Recipe, ShortLink
+
+# Страницы /s/<code>/ с OpenGraph-разметкой для превью в соцсетях.
+# Страница рендерится один раз на версию рецепта в SHARE_PAGES_ROOT,
+# откуда ее отдает nginx; при изменении рецепта файл удаляется и
+# рендерится заново при следующем обращении.
+
+
+def page_path(code):
+    return os.path.join(settings.SHARE_PAGES_ROOT, f'{code}.html')
+
+
+def render_share_page(link):
+    recipe = link.recipe
+    origin = '{0.scheme}://{0.netloc}'.format(urlsplit(link.original_url))
+    return render_to_string('recipes/share.html', {
+        'recipe': recipe,
+        'url': link.original_url,
+        'description': Truncator(' '.join(recipe.text.split())).chars(
+            SHARE_DESCRIPTION_LENGTH),
+        'image': (origin + default_storage.url(recipe.image.name)
+                  if recipe.image else None),
+    })
+
+
+def share_links():
+    return ShortLink.objects.select_related('recipe').filter(
+        recipe__isnull=False, recipe__is_deleted=False)
+
+
+def build_share_page(link):
+    html = render_share_page(link)
+    path = page_path(link.short_code)
+    write_atomic(path, html.encode())
+    # Рецепт мог измениться, пока страница рендерилась: такая страница
+    # удаляется, чтобы не пережить инвалидацию.
+    if not Recipe.objects.filter(pk=link.recipe_id,
+                                 version=link.recipe.version).exists():
+        remove_file(path)
+    return html
+
+
+def get_share_page(code):
+    try:
+        with open(page_path(code), encoding='utf-8') as file:
+            return file.read()
+    except FileNotFoundError:
+        pass
+    link = share_links().filter(short_code=code).first()
+    if link is None:
+        return None
+    return build_share_page(link)
+
+
+def invalidate_share_pages(recipe_ids):
+    for code in ShortLink.objects.filter(
+            recipe_id__in=recipe_ids).values_list('short_code', flat=True):
+        remove_file(page_path(code))
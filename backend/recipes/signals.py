@@ -0,0 +1,144 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, Value, When
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import Signal, receiver
+
+from api.downloads import remove_file
+from recipes.catalog import assign_tag_bits, invalidate_tag_catalog
+from recipes.constants import (TRENDING_WEIGHT_FAVORITE,
+                               TRENDING_WEIGHT_SHOPPING_CART)
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShortLink, Tag)
+from recipes.pantry import invalidate_pantry_index
+from recipes.purge import recipes_deleted
+from recipes.share import invalidate_share_pages, page_path
+from recipes.trending import bump_trending
+from users.models import User
+
+RecipeTags = Recipe.tags.through
+
+# Отправляется после UPDATE рецептов в обход save(), аргумент recipe_ids.
+recipes_updated = Signal()
+
+
+def bump_versions(recipes):
+    recipe_ids = list(recipes.values_list('pk', flat=True).distinct())
+    if recipe_ids:
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            version=F('version') + 1)
+        recipes_updated.send(sender=Recipe, recipe_ids=recipe_ids)
+    return len(recipe_ids)
+
+
+def refresh_tags_masks(recipe_ids):
+    masks = defaultdict(int)
+    for recipe_id, bit in RecipeTags.objects.filter(
+            recipe_id__in=recipe_ids, tag__bit__isnull=False).values_list(
+            'recipe_id', 'tag__bit'):
+        masks[recipe_id] |= 1 << bit
+    # Одно UPDATE на все рецепты: разных масок немного, поэтому в CASE по
+    # одной ветке на маску, рецепты без тегов получают 0.
+    by_mask = defaultdict(list)
+    for recipe_id, mask in masks.items():
+        by_mask[mask].append(recipe_id)
+    recipes = Recipe.objects.filter(pk__in=recipe_ids)
+    updated_ids = list(recipes.values_list('pk', flat=True))
+    recipes.update(
+        tags_mask=Case(
+            *(When(pk__in=ids, then=Value(mask))
+              for mask, ids in by_mask.items()),
+            default=Value(0), output_field=BigIntegerField()),
+        version=F('version') + 1)
+    if updated_ids:
+        recipes_updated.send(sender=Recipe, recipe_ids=updated_ids)
+    return masks
+
+
+@receiver(m2m_changed, sender=RecipeTags)
+def update_tags_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.tags_mask = refresh_tags_masks([instance.pk])[instance.pk]
+    elif action == 'post_clear':
+        refresh_tags_masks(instance._cleared_recipe_ids)
+    else:
+        refresh_tags_masks(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if created and instance.bit is None:
+        assign_tag_bits()
+    invalidate_tag_catalog()
+    if not created:
+        bump_versions(Recipe.objects.filter(tags=instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    instance._tagged_recipe_ids = list(
+        instance.recipe_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    invalidate_tag_catalog()
+    refresh_tags_masks(instance._tagged_recipe_ids)
+    if instance.bit is not None:
+        refresh_tags_masks(list(RecipeTags.objects.filter(
+            tag_id__in=assign_tag_bits()).values_list(
+            'recipe_id', flat=True).distinct()))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if not created:
+        bump_versions(Recipe.objects.filter(ingredient=instance))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    bump_versions(Recipe.objects.filter(pk=instance.recipe_id))
+    invalidate_pantry_index()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(recipes_deleted, sender=Recipe)
+def recipe_changed(sender, instance=None, recipe_ids=(), **kwargs):
+    invalidate_pantry_index()
+    recipe_ids = [instance.pk] if instance is not None else list(recipe_ids)
+    transaction.on_commit(lambda: invalidate_share_pages(recipe_ids))
+
+
+@receiver(post_delete, sender=ShortLink)
+def short_link_deleted(sender, instance, **kwargs):
+    remove_file(page_path(instance.short_code))
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        bump_trending(instance.recipe_id, TRENDING_WEIGHT_FAVORITE)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    if created:
+        bump_trending(instance.recipe_id, TRENDING_WEIGHT_SHOPPING_CART)
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    bump_versions(Recipe.objects.filter(author=instance))
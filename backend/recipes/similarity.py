@@ -0,0 +1,124 @@
+import math
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.constants import (SIMILAR_MAX_DF, SIMILAR_RECIPES_CANDIDATES,
+                               SIMILAR_RECIPES_LIMIT)
+from recipes.models import Recipe, RecipeIngredient, RecipeNeighbor
+
+COSINE = 'cosine'
+JACCARD = 'jaccard'
+FREQUENT_INGREDIENTS_KEY = 'recipes:frequent_ingredients:{}'
+# Без пересчета build_recipe_neighbors список частых ингредиентов
+# обновляется раз в час.
+FREQUENT_INGREDIENTS_TTL = 3600
+
+
+def similarity(overlap, size, other_size, metric):
+    if metric == JACCARD:
+        return overlap / (size + other_size - overlap)
+    return overlap / math.sqrt(size * other_size)
+
+
+def document_frequency_limit(max_df, recipe_count):
+    return max(max_df * recipe_count, 1)
+
+
+def remember_frequent_ingredients(ingredient_ids, max_df=SIMILAR_MAX_DF):
+    # Полный пересчет сохраняет набор, по которому считал, чтобы
+    # инкрементальные оценки совпадали с его оценками.
+    cache.set(FREQUENT_INGREDIENTS_KEY.format(max_df),
+              frozenset(ingredient_ids), None)
+
+
+def get_frequent_ingredients(max_df=SIMILAR_MAX_DF):
+    key = FREQUENT_INGREDIENTS_KEY.format(max_df)
+    frequent = cache.get(key)
+    if frequent is None:
+        limit = document_frequency_limit(max_df, Recipe.objects.count())
+        frequent = frozenset(RecipeIngredient.objects.filter(
+            recipe__is_deleted=False).values('ingredient_id').annotate(
+            frequency=Count('id')).filter(frequency__gt=limit).values_list(
+            'ingredient_id', flat=True))
+        cache.set(key, frequent, FREQUENT_INGREDIENTS_TTL)
+    return frequent
+
+
+def score_recipes(recipe_id, metric=COSINE, others=None):
+    # Оценки рецептов, у которых есть общие с recipe_id ингредиенты, кроме
+    # частых. Без others берутся SIMILAR_RECIPES_CANDIDATES рецептов с
+    # наибольшим пересечением, с others — только они.
+    frequent = get_frequent_ingredients()
+    ingredient_ids = [
+        ingredient_id for ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id=recipe_id).values_list('ingredient_id', flat=True)
+        if ingredient_id not in frequent
+    ]
+    if not ingredient_ids:
+        return {}
+    overlaps = RecipeIngredient.objects.filter(
+        ingredient_id__in=ingredient_ids, recipe__is_deleted=False
+    ).exclude(recipe_id=recipe_id)
+    if others is not None:
+        overlaps = overlaps.filter(recipe_id__in=others)
+    overlaps = overlaps.values('recipe_id').annotate(
+        overlap=Count('id')
+    ).order_by('-overlap').values_list('recipe_id', 'overlap')
+    overlaps = dict(overlaps if others is not None
+                    else overlaps[:SIMILAR_RECIPES_CANDIDATES])
+    sizes = RecipeIngredient.objects.filter(
+        recipe_id__in=overlaps).exclude(ingredient_id__in=frequent).values(
+        'recipe_id').annotate(size=Count('id')).order_by().values_list(
+        'recipe_id', 'size')
+    return {
+        other_id: similarity(overlaps[other_id], len(ingredient_ids), size,
+                             metric)
+        for other_id, size in sizes
+    }
+
+
+def top_k(scores, k):
+    return sorted(((score, other_id) for other_id, score in scores.items()),
+                  reverse=True)[:k]
+
+
+def find_neighbors(recipe_id, k=SIMILAR_RECIPES_LIMIT, metric=COSINE):
+    return top_k(score_recipes(recipe_id, metric), k)
+
+
+def replace_neighbors(recipe_id, neighbors):
+    RecipeNeighbor.objects.filter(recipe_id=recipe_id).delete()
+    RecipeNeighbor.objects.bulk_create(
+        RecipeNeighbor(recipe_id=recipe_id, neighbor_id=other_id,
+                       score=score) for score, other_id in neighbors)
+
+
+@transaction.atomic
+def update_recipe_neighbors(recipe_id, k=SIMILAR_RECIPES_LIMIT,
+                            metric=COSINE):
+    previous = dict(RecipeNeighbor.objects.filter(
+        neighbor_id=recipe_id).values_list('recipe_id', 'score'))
+    scores = {}
+    if Recipe.objects.filter(pk=recipe_id).exists():
+        scores = score_recipes(recipe_id, metric)
+        missing = set(previous) - set(scores)
+        if missing:
+            scores.update(score_recipes(recipe_id, metric, missing))
+    neighbors = top_k(scores, k)
+    replace_neighbors(recipe_id, neighbors)
+    # Сохранены только top-k каждого рецепта. Если рецепт поднялся или
+    # появился у соседа, его top-k — лучшие k из сохраненных и нового
+    # значения; если опустился или пропал, top-k соседа считается заново.
+    for other_id in set(previous) | {other for _, other in neighbors}:
+        score = scores.get(other_id)
+        if other_id in previous and (score is None
+                                     or score < previous[other_id]):
+            replace_neighbors(other_id, find_neighbors(other_id, k, metric))
+        elif score is not None:
+            other_scores = dict(RecipeNeighbor.objects.filter(
+                recipe_id=other_id).values_list('neighbor_id', 'score'))
+            other_scores[recipe_id] = score
+            replace_neighbors(other_id, top_k(other_scores, k))
+    return neighbors
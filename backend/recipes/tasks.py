@@ -0,0 +1,55 @@
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image
+
+from jobs.queue import task
+from recipes.constants import MAX_IMAGE_SIDE
+from recipes.models import Recipe
+from recipes.purge import purge_recipes, purge_user
+from recipes.similarity import update_recipe_neighbors
+
+
+@task('recipes.optimize_image', queue='images')
+def optimize_image(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    with recipe.image.open('rb') as file:
+        image = Image.open(file)
+        image.load()
+    if max(image.size) <= MAX_IMAGE_SIDE:
+        return
+    image_format = image.format
+    image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+    buffer = BytesIO()
+    image.save(buffer, format=image_format)
+    # Файлы неизменяемы: уменьшенная картинка получает новое имя, а старый
+    # файл удаляется, только если рецепт все еще ссылается на него.
+    storage, name = recipe.image.storage, recipe.image.name
+    new_name = storage.save(name, ContentFile(buffer.getvalue()))
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=recipe_id, image=name).first()
+        if recipe is None:
+            storage.delete(new_name)
+            return
+        recipe.image.name = new_name
+        recipe.save(update_fields=('image',))
+    storage.delete(name)
+
+
+@task('recipes.update_neighbors')
+def update_neighbors(recipe_id):
+    update_recipe_neighbors(recipe_id)
+
+
+@task('recipes.purge_recipes', queue='purge')
+def purge_recipes_task(recipe_ids):
+    purge_recipes(recipe_ids)
+
+
+@task('recipes.purge_user', queue='purge')
+def purge_user_task(user_id):
+    purge_user(user_id)
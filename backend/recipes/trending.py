@@ -0,0 +1,62 @@
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from recipes.constants import TRENDING_REBASE_AFTER
+from recipes.models import RecipeStats, TrendingReference
+
+# Счет хранится в масштабе точки отсчета: вклад события w в момент t
+# равен w * exp((t - reference) / tau). Порядок по хранимому значению
+# совпадает с порядком по затухшему счету, поэтому затухание не требует
+# периодической перезаписи таблицы.
+
+
+def decay_time():
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+
+
+def get_reference():
+    reference = TrendingReference.objects.order_by('pk').first()
+    if reference is None:
+        reference = TrendingReference.objects.create()
+    if (now() - reference.reference).total_seconds() / decay_time() > (
+            TRENDING_REBASE_AFTER):
+        reference = rebase()
+    return reference.reference
+
+
+@transaction.atomic
+def rebase():
+    reference = TrendingReference.objects.select_for_update().order_by(
+        'pk').first()
+    moment = now()
+    factor = math.exp(
+        -(moment - reference.reference).total_seconds() / decay_time())
+    RecipeStats.objects.filter(trending_score__gt=0).update(
+        trending_score=F('trending_score') * factor)
+    reference.reference = moment
+    reference.save(update_fields=('reference',))
+    return reference
+
+
+def scaled(weight, moment=None, reference=None):
+    moment = moment or now()
+    reference = reference or get_reference()
+    return weight * math.exp(
+        (moment - reference).total_seconds() / decay_time())
+
+
+def bump_trending(recipe_id, weight):
+    value = scaled(weight)
+    if not RecipeStats.objects.filter(recipe_id=recipe_id).update(
+            trending_score=F('trending_score') + value):
+        RecipeStats.objects.get_or_create(recipe_id=recipe_id)
+        RecipeStats.objects.filter(recipe_id=recipe_id).update(
+            trending_score=F('trending_score') + value)
+
+
+def current_score(stored_score):
+    return stored_score / scaled(1)
@@ -1,7 +1,35 @@
+from functools import partial
+
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect
 
+from api.async_views import run_db
+from api.cache import short_link_cache
 from recipes.models import ShortLink
+from recipes.share import get_share_page
+
+
+def load_original_url(code):
+    return get_object_or_404(ShortLink, short_code=code).original_url
+
+
+def get_original_url(code):
+    return short_link_cache.get_or_set(code,
+                                       partial(load_original_url, code))
+
+
+def share_response(code):
+    # Ссылки без рецепта (старые или на удаленный рецепт) ведут прямо на
+    # исходный адрес.
+    html = get_share_page(code)
+    if html is None:
+        return redirect(get_original_url(code))
+    return HttpResponse(html)
+
+
+def share_recipe(request, code):
+    return share_response(code)
 
 
-def redirect_to_recipe(request, code):
-    return redirect(get_object_or_404(ShortLink, short_code=code).original_url)
+async def share_recipe_async(request, code):
+    return await run_db(share_response, code)
@@ -1,33 +1,49 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
+from recipes.admin_tools import (AutocompleteFilter, ScalableModelAdmin,
+                                 count_subquery)
+from recipes.models import Recipe
+
 from .models import Subscription, User
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
-    list_display = ('id', 'email', 'username', 'first_name', 'last_name')
+class UserAdmin(ScalableModelAdmin, BaseUserAdmin):
+    list_display = ('id', 'email', 'username', 'first_name', 'last_name',
+                    'recipe_count', 'subscription_count')
     search_fields = ('username', 'email', 'first_name', 'last_name')
-    list_filter = ('username', 'email')
+    list_filter = ('is_active', 'is_staff')
 
     fieldsets = BaseUserAdmin.fieldsets + (
         (None, {'fields': ('avatar',)}),
     )
     add_fieldsets = BaseUserAdmin.add_fieldsets
 
-    @admin.display(description='Кол-во рецептов')
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_total=count_subquery(Recipe.objects, 'author'),
+            subscribers_total=count_subquery(Subscription.objects, 'author'),
+        )
+
+    @admin.display(description='Кол-во рецептов', ordering='recipes_total')
     def recipe_count(self, obj):
-        count = obj.recipes.count()
+        count = obj.recipes_total
         return f'{count} {"рецепт" if count >= 1 else "рецепта"}'
 
-    @admin.display(description='Кол-во подписчиков')
+    @admin.display(description='Кол-во подписчиков',
+                   ordering='subscribers_total')
     def subscription_count(self, obj):
-        count = obj.subscribers.count()
+        count = obj.subscribers_total
         return f'{count} {"подписчик" if count >= 1 else "подписчика"}'
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(ScalableModelAdmin):
     list_display = ('id', 'user', 'author')
-    search_fields = ('user', 'author')
-    list_filter = ('user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'user__email',
+                     'author__username', 'author__email')
+    list_filter = (('user', AutocompleteFilter),
+                   ('author', AutocompleteFilter))
+    autocomplete_fields = ('user', 'author')